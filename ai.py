@@ -1,113 +1,775 @@
+import os
+import sys
 import random
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
 
 ###############################################################################
+#
+# Bitboard engine
+#
+# The squares are stored row by row, size + 1 bits per row: the squares of the
+# row followed by a ghost bit. With this padding every diagonal step is a
+# constant shift, -(size + 2)/-size towards the black side and +size/+(size + 2)
+# towards the white side (-10/-8/8/10 on the 8x8 board), and the ghost bits
+# swallow the steps falling off the left or right edge of the board. Discs only
+# ever move along diagonals so the dark and the light squares behave as two
+# independent boards sharing the same masks.
+#
+# A position is a tuple (black, white, kings) of three masks. The masks do not
+# tell the size of the board, the functions handling positions of other sizes
+# than 8x8 take the _Layout of the size.
+#
+###############################################################################
+
+# Largest supported board size
+_MAX_SIZE = 12
+
+class _Layout(object):
+    """
+        Lookup tables of a board size, computed once by _layout():
+        - size:        the number of rows and columns
+        - king_dirs:   the diagonal steps ordered as top left, top right, bottom
+                       left, bottom right
+        - men_dirs:    the steps allowed to the men of each color
+        - squares:     the squares as (bit index, row, col) in row major order
+        - bit_pos:     the coordinates of each bit index, None for ghost bits
+        - valid:       the mask of the squares of the board
+        - rows:        the mask of each row
+        - promo_row:   the promotion row of each color
+        - front_rows:  the squares out of the back row of each color
+        - center_rows: the rows grouped by king centering weight, (size - 1) / 2
+                       minus the distance to the middle row
+        - center:      the king centering weight of each bit index
+    """
+    def __init__(self, size):
+        stride = size + 1
+        middle = (size - 1) / 2.0
+        self.size = size
+        self.king_dirs = (-stride - 1, -stride + 1, stride - 1, stride + 1)
+        self.men_dirs = {"b": self.king_dirs[2:], "w": self.king_dirs[:2]}
+        self.squares = [(r * stride + c, r, c) for r in range(0, size) \
+            for c in range(0, size)]
+
+        self.bit_pos = [None] * (size * stride)
+        for bit, row, col in self.squares:
+            self.bit_pos[bit] = (row, col)
+
+        self.valid = sum(1 << s[0] for s in self.squares)
+        self.rows = [sum(1 << s[0] for s in self.squares if s[1] == r) \
+            for r in range(0, size)]
+        self.promo_row = {"b": self.rows[size - 1], "w": self.rows[0]}
+        self.front_rows = {"b": self.valid & ~self.rows[0], \
+            "w": self.valid & ~self.rows[size - 1]}
+        self.center_rows = [(middle - abs(r - middle), \
+            self.rows[r] | self.rows[size - 1 - r]) for r in range(0, size // 2)]
+        self.center = [0 if p is None else middle - abs(p[0] - middle) \
+            for p in self.bit_pos]
+
+_layouts = {}
+
+def _layout(size):
+    """
+        Arguments:
+        - size: the number of rows and columns of the board
 
-def _get_color_discs(board, color):
+        Return value:
+        - layout: the _Layout of the size, built on first use
     """
-        Find all the discs of the given color.
+    layout = _layouts.get(size)
+    if layout is None:
+        if not 4 <= size <= _MAX_SIZE:
+            raise ValueError("Unsupported board size: %d" % size)
+        layout = _layouts[size] = _Layout(size)
+    return layout
+
+# Layout of the standard board, used by default
+_LAYOUT = _layout(8)
+
+# Values used for positions by the evaluation
+DISC_VAL = 1        # Value of a normal disc
+KING_VAL = 3        # King
+CNTR_VAL = 0.01     # King in the midle
+UNPD_VAL = 0.5      # Unprotected score
+
+# Move ordering heuristics used by the search, by priority
+MOVE_ORDERING = ("captures", "length", "killers", "history")
+
+_INFINITY = float("inf")
+
+# Maximum number of capturing moves resolved after the search depth
+QS_DEPTH = 12
+
+# Endgame table probed by the search when the file exists, see tablebase.py,
+# and score of a won table position, minus the number of moves from it to the
+# end of the game
+ENDGAME_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "endgame.tb")
+ENDGAME_WIN = 1000
+
+# Opening book consulted by play() when the file exists, see openingbook.py
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "opening.book")
+
+# Analysis cache consulted and filled by play() when the file exists, see
+# AnalysisCache, and its maximum number of entries
+ANALYSIS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+    "analysis.db")
+ANALYSIS_MAX_ENTRIES = 1000000
+
+# Default time budget of play() in seconds
+TIME_LIMIT = 0.5
+
+# Maximum depth of a search, whatever its time budget: positions with kings
+# never run out of moves and the search recurses about once per ply
+MAX_DEPTH = 64
+
+# Function called by play() with the SearchResult and the SearchStats of each
+# turn, None to not gather statistics
+STATS_CALLBACK = None
+
+# Whether play() keeps searching on the opponent's time, see Ponderer, and the
+# maximum depth of a ponder search when play() has a time budget, which is
+# normally stopped by the opponent's move long before
+PONDER = False
+PONDER_DEPTH = 32
+
+# Number of nodes between two checks of the search deadline, minus one
+_TIME_CHECK = 255
+
+# Memory footprint in MB of the legal move cache, of each process
+MOVE_CACHE_SIZE_MB = 8
+
+# Memory footprint in MB of the capture chains cache, of each process
+CHAIN_CACHE_SIZE_MB = 32
+
+# Default memory footprint in MB and replacement policy ("depth" or
+# "always") of the transposition table
+TT_SIZE_MB = 16
+TT_REPLACE = "depth"
+
+# Relative margin opening the root window just below the best score
+_TIE_MARGIN = 1e-9
+
+# Bytes per entry of the capture chains cache, 220 to 340 measured on 8x8
+# boards, and its maximum number of entries
+_CHAIN_ENTRY_SIZE = 320
+_CHAIN_CACHE_SIZE = CHAIN_CACHE_SIZE_MB * 2 ** 20 // _CHAIN_ENTRY_SIZE
+_chain_cache = {}
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(x):
+        return bin(x).count("1")
+
+# Array type code of the 64 bits hashes, Python 2 has no "Q" but its "L" is
+# 64 bits wide on 64 bits Unix systems
+try:
+    _HASH_TYPECODE = "Q"
+    array(_HASH_TYPECODE)
+except ValueError:
+    _HASH_TYPECODE = "L"
+
+###############################################################################
+
+def _shift(mask, step, valid):
+    """
+        Move every square of a mask one diagonal step.
 
         Arguments:
+        - mask:  the squares to move
+        - step:  the diagonal step, one of the layout king_dirs
+        - valid: the mask of the squares of the board
+
+        Return value:
+        - mask: the moved squares, the ones leaving the board are dropped
+    """
+    if step > 0:
+        return (mask << step) & valid
+    return (mask >> -step) & valid
+
+###############################################################################
+
+def _board_to_bits(board):
+    """
+        Convert a board to its bitboard position.
+
+        Arguments:
+        - board: the content of the board, of any supported size
+
+        Return value:
+        - pos: the (black, white, kings) masks
+    """
+    if isinstance(board, Board):
+        return board.bits
+    black = white = kings = 0
+    for bit, row, col in _layout(len(board)).squares:
+        disc = board[row][col]
+        if disc == "_":
+            continue
+        if disc in "bB":
+            black |= 1 << bit
+        else:
+            white |= 1 << bit
+        if disc in "BW":
+            kings |= 1 << bit
+
+    return black, white, kings
+
+###############################################################################
+
+def _bits_to_board(pos, layout=_LAYOUT):
+    """
+        Convert a bitboard position back to a board.
+
+        Arguments:
+        - pos:    the (black, white, kings) masks
+        - layout: the _Layout of the board size
+
+        Return value:
         - board: the content of the board
-        - color: the next player's color
+    """
+    black, white, kings = pos
+    rows = [["_"] * layout.size for _ in range(0, layout.size)]
+    for bit, row, col in layout.squares:
+        mask = 1 << bit
+        if black & mask:
+            rows[row][col] = "B" if kings & mask else "b"
+        elif white & mask:
+            rows[row][col] = "W" if kings & mask else "w"
+
+    return ["".join(r) for r in rows]
+
+###############################################################################
+
+def _move_path(move, layout=_LAYOUT):
+    """
+        Convert a bitboard move to the list of visited squares.
+
+        Arguments:
+        - move:   the bitboard move
+        - layout: the _Layout of the board size
 
         Return value:
-        - discs_pos: list of all discs position stored as [row, col]
+        - path: list of (row, col) squares, from the initial position
+    """
+    bit_pos = layout.bit_pos
+    return [bit_pos[bit] for bit in move[0]]
+
+###############################################################################
+
+def _jump_chains(opp, occ, sq, king, color, layout):
     """
-    discs_pos = []
+        Recursively expand the jumps available to a disc, depth first. Each
+        jump is applied by removing the captured disc from the masks given to
+        the recursive call, so that nothing has to be copied or undone. The
+        chains only depend on the arguments, which are used as the key of a
+        cache: the same sub-chain reached through different jump orders, which
+        is common with kings, is expanded once.
+
+        Arguments:
+        - opp:   the mask of the opponent discs
+        - occ:   the mask of the occupied squares, without the jumping disc
+        - sq:    the bit of the square of the jumping disc
+        - king:  whether the jumping disc is a king
+        - color: the color of the jumping disc
+        - layout: the _Layout of the board size
+
+        Return value:
+        - chains: tuple of (path, captured, king) for each maximal sequence of
+                  jumps, where path lists the bit indexes of the landing
+                  squares, in depth first order. It is empty when no jump is
+                  possible.
+    """
+    cache_key = (opp, occ, sq, king, color, layout.size)
+    chains = _chain_cache.get(cache_key)
+    if chains is not None:
+        return chains
+
+    chains = []
+    valid = layout.valid
+    for step in (layout.king_dirs if king else layout.men_dirs[color]):
+        if step > 0:
+            mid = (sq << step) & opp
+            land = (mid << step) & valid & ~occ
+        else:
+            mid = (sq >> -step) & opp
+            land = (mid >> -step) & valid & ~occ
+        if not land:
+            continue
 
-    for row in range(0, 8):
-        line = board[row].lower() # remove kings
-        col = -1
-        while line.find(color, col + 1) != -1:
-            col = line.find(color, col + 1)
-            discs_pos.append([row, col])
+        # Capture the disc, then extend the chain from the landing square
+        land_king = king or bool(land & layout.promo_row[color])
+        land_bit = (land.bit_length() - 1,)
+        next_chains = _jump_chains(opp ^ mid, occ ^ mid, land, land_king, \
+            color, layout)
+        if next_chains:
+            for path, captured, end_king in next_chains:
+                chains.append((land_bit + path, captured | mid, end_king))
+        else:
+            chains.append((land_bit, mid, land_king))
 
-    return discs_pos
+    if len(_chain_cache) >= _CHAIN_CACHE_SIZE:
+        _chain_cache.clear()
+    chains = tuple(chains)
+    _chain_cache[cache_key] = chains
+
+    return chains
 
 ###############################################################################
 
-def _next_non_capt(board, disc_pos):
+def _capture_chains(pos, color, src, layout=_LAYOUT):
     """
-        Find all possible next non capturing positions.
+        Expand all the capturing sequences of a single disc.
 
         Arguments:
-        - board:    the content of the board
-        - disc_pos: the position of the player disc
+        - pos:    the (black, white, kings) masks
+        - color:  the color of the disc
+        - src:    the bit of the disc, which must have at least one capture
+        - layout: the _Layout of the board size
 
         Return value:
-        - positions: a list of valid non capturing moves.
+        - moves: list of capturing moves, the shortest first and in depth first
+                 order otherwise, which is the order of a breadth first search
     """
-    # Get the disc attributes
-    row, col = disc_pos
-    color = board[row].lower()[col]
-    king = False if board[row][col] == color else True
+    black, white, kings = pos
+    opp = white if color == "b" else black
+    start_king = bool(kings & src)
+    src_bit = (src.bit_length() - 1,)
+
+    chains = _jump_chains(opp, (black | white) & ~src, src, start_king, \
+        color, layout)
+    moves = [(src_bit + path, captured, king and not start_king) \
+        for path, captured, king in chains]
+    if len(moves) > 1:
+        moves.sort(key=lambda m: len(m[0]))
 
-    if king:
-        # Define the four diagonal positions
-        bot_left  = [[row + 1, col - 1]] if col > 0 and row < 7 else []
-        bot_right = [[row + 1, col + 1]] if col < 7 and row < 7 else []
-        top_left  = [[row - 1, col - 1]] if col > 0 and row > 0 else []
-        top_right = [[row - 1, col + 1]] if col < 7 and row > 0 else []
-        positions = top_left + top_right + bot_left + bot_right
-    else:
-        # Define the forward direction
-        fwd = 1 if color == "b" else -1
+    return moves
 
-        # Define the two left and right position
-        f_row = row + fwd
-        left  = [[f_row, col - 1]] if col > 0 and f_row in range(0, 8) else []
-        right = [[f_row, col + 1]] if col < 7 and f_row in range(0, 8) else []
-        positions = left + right
+###############################################################################
+
+def _gen_moves(pos, color, all_moves=True, layout=_LAYOUT):
+    """
+        Compute either all allowed moves or only the capturing moves of a
+        bitboard position.
+
+        A move is a tuple (path, captured, promoted) where path lists the bit
+        indexes visited by the disc, captured is the mask of the captured
+        discs and promoted tells whether the disc is crowned during the move.
+
+        Arguments:
+        - pos:   the (black, white, kings) masks
+        - color: the next player's color
+        - all_moves: boolean representing whether we should return all possible
+                 moves (True, by default) or only the capturing moves (False)
+        - layout: the _Layout of the board size
 
-    # Check that the moves are indeed possible
-    positions = [p for p in positions if board[p[0]][p[1]] == "_"]
+        Return value:
+        - moves: list of the valid moves, ordered by disc then direction
+    """
+    black, white, kings = pos
+    own, opp = (black, white) if color == "b" else (white, black)
+    valid = layout.valid
+    empty = valid & ~(black | white)
+    own_kings = own & kings
+    king_dirs = layout.king_dirs
+    men_dirs = layout.men_dirs[color]
+
+    # Discs able to jump in each direction
+    jumpers = 0
+    for step in king_dirs:
+        movers = own if step in men_dirs else own_kings
+        jumpers |= movers & _shift(opp & _shift(empty, -step, valid), -step, \
+            valid)
+
+    moves = []
+    if jumpers:
+        while jumpers:
+            src = jumpers & -jumpers
+            jumpers ^= src
+            moves += _capture_chains(pos, color, src, layout)
+        return moves
+
+    if not all_moves:
+        return moves
+
+    # Discs able to slide in each direction
+    sliders = {}
+    for step in king_dirs:
+        movers = own if step in men_dirs else own_kings
+        sliders[step] = movers & _shift(empty, -step, valid)
+
+    promo = layout.promo_row[color]
+    sources = 0
+    for step in king_dirs:
+        sources |= sliders[step]
+    while sources:
+        src = sources & -sources
+        sources ^= src
+        king = bool(src & own_kings)
+        for step in king_dirs:
+            if src & sliders[step]:
+                dst = _shift(src, step, valid)
+                moves.append(((src.bit_length() - 1, dst.bit_length() - 1), \
+                    0, not king and bool(dst & promo)))
 
-    return positions
+    return moves
 
 ###############################################################################
 
-def _next_capt(board, disc_pos):
+def _apply_move(pos, color, move):
     """
-        Find all possible next capturing positions.
+        Play a move on a bitboard position.
 
         Arguments:
-        - board:    the content of the board
-        - disc_pos: the position of the player disc
+        - pos:   the (black, white, kings) masks
+        - color: the color of the moving disc
+        - move:  the bitboard move
 
         Return value:
-        - positions: a list of valid capturing moves.
+        - pos: the new (black, white, kings) masks
     """
-    # Get the disc attributes
-    row, col = disc_pos
-    color = board[row].lower()[col]
-    king = False if board[row][col] == color else True
+    black, white, kings = pos
+    path, captured, promoted = move
+    src = 1 << path[0]
+    dst = 1 << path[-1]
+
+    if color == "b":
+        black = (black & ~src) | dst
+        white &= ~captured
+    else:
+        white = (white & ~src) | dst
+        black &= ~captured
 
-    if king:
-        # Define the four diagonal positions
-        bot_left  = [[row + 2, col - 2]] if col > 1 and row < 6 else []
-        bot_right = [[row + 2, col + 2]] if col < 6 and row < 6 else []
-        top_left  = [[row - 2, col - 2]] if col > 1 and row > 1 else []
-        top_right = [[row - 2, col + 2]] if col < 6 and row > 1 else []
-        positions = top_left + top_right + bot_left + bot_right
+    if promoted or kings & src:
+        kings = (kings & ~src & ~captured) | dst
     else:
-        # Define the forward direction
-        fwd = 1 if color == "b" else -1
+        kings &= ~captured
+
+    return black, white, kings
+
+###############################################################################
+#
+# Zobrist hashing: each (square, disc) pair has a random 64 bits key and the
+# hash of a position is the xor of the keys of its discs, with an extra key
+# when white is to move. Playing a move only changes a few keys so the hash is
+# updated incrementally along the search.
+#
+###############################################################################
+
+# Disc kinds indexing the Zobrist keys
+_KIND = {"b": 0, "B": 1, "w": 2, "W": 3}
+
+_zobrist_rng = random.Random(2016)
+_ZOBRIST = [_zobrist_rng.getrandbits(64) \
+    for _ in range(0, 4 * len(_LAYOUT.bit_pos) - 4)]
+_ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+_ZOBRIST_VIEW = {"b": 0, "w": _zobrist_rng.getrandbits(64)}
+
+# Keys of the larger boards, drawn last so that the 8x8 ones do not change,
+# and key of the board size mixed in the transposition table hashes
+_ZOBRIST += [_zobrist_rng.getrandbits(64) \
+    for _ in range(len(_ZOBRIST), 4 * _MAX_SIZE * (_MAX_SIZE + 1))]
+_ZOBRIST_SIZE = dict((size, 0 if size == 8 else _zobrist_rng.getrandbits(64)) \
+    for size in range(4, _MAX_SIZE + 1))
+
+###############################################################################
+
+def _hash_bits(pos, color):
+    """
+        Compute the Zobrist hash of a position from scratch.
+
+        Arguments:
+        - pos:   the (black, white, kings) masks
+        - color: the next player's color
+
+        Return value:
+        - key: the 64 bits hash of the position
+    """
+    black, white, kings = pos
+    key = _ZOBRIST_SIDE if color == "w" else 0
+    discs = black | white
+    while discs:
+        mask = discs & -discs
+        discs ^= mask
+        kind = (0 if black & mask else 2) + (1 if kings & mask else 0)
+        key ^= _ZOBRIST[4 * (mask.bit_length() - 1) + kind]
+
+    return key
+
+###############################################################################
+
+def _move_key(kings, color, move):
+    """
+        Compute the change of the Zobrist hash produced by a move.
+
+        Arguments:
+        - kings: the mask of the kings before the move
+        - color: the color of the moving disc
+        - move:  the bitboard move
 
-        # Define the two left and right position
-        f_row = row + 2 * fwd
-        left  = [[f_row, col - 2]] if col > 1 and f_row in range(0, 8) else []
-        right = [[f_row, col + 2]] if col < 6 and f_row in range(0, 8) else []
-        positions = left + right
+        Return value:
+        - key: the value to xor with the hash of the position
+    """
+    path, captured, promoted = move
+    src, dst = path[0], path[-1]
+    own = _KIND[color]
+    opp = 2 - own
+    king = (kings >> src) & 1
+
+    key = _ZOBRIST_SIDE ^ _ZOBRIST[4 * src + own + king] ^ \
+        _ZOBRIST[4 * dst + own + (1 if promoted else king)]
+    while captured:
+        mask = captured & -captured
+        captured ^= mask
+        key ^= _ZOBRIST[4 * (mask.bit_length() - 1) + opp + \
+            (1 if kings & mask else 0)]
+
+    return key
+
+###############################################################################
+#
+# Legal move cache
+#
+# The same positions come back over and over in a search: in sibling
+# subtrees, in the capture resolution of the leaves, and from one iteration
+# or one turn to the next. Their moves are kept in a bounded cache, evicting
+# the least recently used position first. A plain dict keeps its insertion
+# order, so a hit moves the position to the end and the oldest one is the
+# first key.
+#
+###############################################################################
+
+class MoveCache(object):
+    """
+        Bounded LRU cache of the moves of positions. The moves are returned as
+        a tuple of immutable bitboard moves, shared by all the callers.
+
+        The hit rate of a search hardly depends on the number of entries, 22%
+        at depth 3 from 8000 to 200000 entries, so a few MB are enough.
+
+        Arguments:
+        - size_mb: memory footprint in MB, which sets the maximum number of
+                   cached (position, color, all_moves) keys
+    """
+    ENTRY_SIZE = 1024   # Bytes per entry: 450 to 1300 measured on 8x8 boards
+
+    def __init__(self, size_mb=MOVE_CACHE_SIZE_MB):
+        self.size = max(1, int(size_mb * 2 ** 20) // self.ENTRY_SIZE)
+        self.clear()
+
+    def moves(self, pos, color, all_moves=True, layout=_LAYOUT):
+        """
+            Cached version of _gen_moves(), see its documentation.
+
+            Return value:
+            - moves: tuple of the bitboard moves
+        """
+        key = (pos[0], pos[1], pos[2], color, all_moves, layout.size)
+        entries = self.entries
+        moves = entries.pop(key, None)
+        if moves is None:
+            self.misses += 1
+            moves = tuple(_gen_moves(pos, color, all_moves, layout))
+            if len(entries) >= self.size:
+                entries.pop(next(iter(entries)), None)
+                self.evictions += 1
+        else:
+            self.hits += 1
+        entries[key] = moves
+        return moves
+
+    def clear(self):
+        """
+            Remove all the entries and reset the counters.
+        """
+        self.entries = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+            Return value:
+            - stats: dictionary of the cache counters
+        """
+        return {"size": self.size, "used": len(self.entries), \
+            "hits": self.hits, "misses": self.misses, \
+            "evictions": self.evictions}
+
+_move_cache = MoveCache()
+
+def move_cache():
+    """
+        Return value:
+        - cache: the MoveCache shared by the searches and allowed_moves()
+    """
+    return _move_cache
 
-    # Check that the landing positions is empty
-    positions = [p for p in positions if board[p[0]][p[1]] == "_"]
+def clear_caches():
+    """
+        Forget the moves and capture chains of the previous calls, so that the
+        next ones run the move generator rather than hit the caches. The
+        transposition table is left alone, see transposition_table().
+    """
+    _move_cache.clear()
+    _chain_cache.clear()
 
-    # Check that the inbetween position is of the different color
-    positions = [p for p in positions \
-        if board[(row + p[0]) / 2][(col + p[1]) / 2].lower() \
-        not in ["_", color]]
+###############################################################################
 
-    return positions
+class Position(object):
+    """
+        Mutable position used by the search: moves are played and taken back
+        in place instead of building a new position for every node. The
+        Zobrist hash and the material and king centering terms of the
+        evaluation are kept up to date, so that evaluating the position only
+        has to count its unprotected discs.
+
+        Attributes:
+        - black, white, kings: the bitboard masks
+        - turn:   the next player's color
+        - layout: the _Layout of the board size
+        - key:    the Zobrist hash of the position and of the next player
+        - terms:  the evaluation terms, see _eval_terms()
+    """
+    __slots__ = ("black", "white", "kings", "turn", "layout", "key", "terms")
+
+    def __init__(self, pos, turn, layout=_LAYOUT):
+        self.black, self.white, self.kings = pos
+        self.turn = turn
+        self.layout = layout
+        self.key = _hash_bits(pos, turn)
+        self.terms = _eval_terms(pos, layout)
+
+    @classmethod
+    def from_board(cls, board, turn):
+        return cls(_board_to_bits(board), turn, _layout(len(board)))
+
+    def bits(self):
+        """
+            Return value:
+            - pos: the (black, white, kings) masks
+        """
+        return self.black, self.white, self.kings
+
+    def moves(self, all_moves=True):
+        """
+            Arguments:
+            - all_moves: whether to return all the moves or only the capturing
+                         ones, see _gen_moves()
+
+            Return value:
+            - moves: tuple of the bitboard moves of the next player, from the
+                     MoveCache
+        """
+        return _move_cache.moves((self.black, self.white, self.kings), \
+            self.turn, all_moves, self.layout)
+
+    def make_move(self, move):
+        """
+            Play a move of the next player.
+
+            Arguments:
+            - move: the bitboard move
+
+            Return value:
+            - undo: what unmake_move() needs to take the move back
+        """
+        path, captured, promoted = move
+        src = 1 << path[0]
+        dst = 1 << path[-1]
+        black, white, kings = self.black, self.white, self.kings
+        was_king = kings & src
+        capt_kings = kings & captured
+        key = _move_key(kings, self.turn, move)
+        terms = self.terms
+
+        # Update the discs
+        if self.turn == "b":
+            new_black = (black & ~src) | dst
+            new_white = white & ~captured
+            self.turn = "w"
+        else:
+            new_white = (white & ~src) | dst
+            new_black = black & ~captured
+            self.turn = "b"
+        if promoted or was_king:
+            new_kings = (kings & ~src & ~captured) | dst
+        else:
+            new_kings = kings & ~captured
+        self.black, self.white, self.kings = new_black, new_white, new_kings
+        self.key ^= key
+
+        # Update the number of discs and the king centering, which only change
+        # with captures and kings
+        if not (captured or promoted or was_king):
+            return move, was_king, capt_kings, key, terms
+
+        b_discs, b_kings, w_discs, w_kings, b_cntr, w_cntr = terms
+        center = self.layout.center
+        cntr = 0
+        if was_king:
+            cntr = center[path[-1]] - center[path[0]]
+        elif promoted:
+            cntr = center[path[-1]]
+        capt_discs = _popcount(captured & ~kings)
+        capt_cntr = 0
+        mask = capt_kings
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            capt_cntr += center[bit.bit_length() - 1]
+        capt_kings_nb = _popcount(capt_kings)
+        if self.turn == "w":
+            if promoted and not was_king:
+                b_discs, b_kings = b_discs - 1, b_kings + 1
+            self.terms = (b_discs, b_kings, w_discs - capt_discs, \
+                w_kings - capt_kings_nb, b_cntr + cntr, w_cntr - capt_cntr)
+        else:
+            if promoted and not was_king:
+                w_discs, w_kings = w_discs - 1, w_kings + 1
+            self.terms = (b_discs - capt_discs, b_kings - capt_kings_nb, \
+                w_discs, w_kings, b_cntr - capt_cntr, w_cntr + cntr)
+
+        return move, was_king, capt_kings, key, terms
+
+    def unmake_move(self, undo):
+        """
+            Take back the last move played, restoring the captured discs and
+            the king state of the moved disc.
+
+            Arguments:
+            - undo: the value returned by make_move()
+        """
+        move, was_king, captured_kings, key, terms = undo
+        path, captured, _ = move
+        src = 1 << path[0]
+        dst = 1 << path[-1]
+
+        if self.turn == "w":
+            self.black = (self.black & ~dst) | src
+            self.white |= captured
+            self.turn = "b"
+        else:
+            self.white = (self.white & ~dst) | src
+            self.black |= captured
+            self.turn = "w"
+
+        self.kings = (self.kings & ~dst) | captured_kings | was_king
+        self.key ^= key
+        self.terms = terms
+
+    def evaluate(self, our_color):
+        """
+            Same as _eval_bits() on the position, from the running terms.
+        """
+        ours = self.black if our_color == "b" else self.white
+        empty = self.layout.valid & ~(self.black | self.white)
+        unprotected = _unprotected(ours & ~self.kings, empty, our_color, \
+            self.layout)
+        return _score_terms(self.terms, unprotected, our_color)
 
 ###############################################################################
 
@@ -132,7 +794,7 @@ def _update_board_pos(board, prev_pos, next_pos):
 
     # Update next position with previous position and look out for kings
     if old_disc == "b":
-        new_disc = "B" if next_row == 7 else "b"
+        new_disc = "B" if next_row == len(board) - 1 else "b"
     elif old_disc == "w":
         new_disc = "W" if next_row == 0 else "w"
     else:
@@ -148,9 +810,9 @@ def _update_board_pos(board, prev_pos, next_pos):
 
     # Empty intermediary position if it's a capturing move
     if abs(next_row - prev_row) == 2:
-        s = list(new_board[(next_row + prev_row) / 2])
-        s[(next_col + prev_col) / 2] = "_"
-        new_board[(next_row + prev_row) / 2] = "".join(s)
+        s = list(new_board[(next_row + prev_row) // 2])
+        s[(next_col + prev_col) // 2] = "_"
+        new_board[(next_row + prev_row) // 2] = "".join(s)
 
     return new_board
 
@@ -191,88 +853,239 @@ def allowed_moves(board, color, all_moves=True):
         Return value:
         - moves: list of all the valid moves
     """
+    if isinstance(board, Board):
+        return [list(m) for m in board.moves(color, all_moves)]
+    layout = _layout(len(board))
+    pos = _board_to_bits(board)
+    return [_move_path(m, layout) \
+        for m in _move_cache.moves(pos, color, all_moves, layout)]
 
-    # Retrieve next player discs position
-    discs_pos = _get_color_discs(board, color)
-
-    # Compute the possible moves
-    moves_non_capt = []
-    moves_capt = []
-    for disc_pos in discs_pos:
-        # Retrieve initial capturing positions
-        pos_capt_init = _next_capt(board, disc_pos)
-        if pos_capt_init != []:
-            # Define a queue to store all possible position sequences
-            mv_queue = [[disc_pos, p] for p in pos_capt_init]
-
-            # Pop an element from the queue, if there is no more capturing move
-            # then we add it to the final move list otherwise we had the new
-            # steps and add it to the queue.
-            while mv_queue != []:
-                # Get the first element from queue and initialize the board
-                pos_steps = mv_queue.pop(0)
-                new_board = board[:]
-
-                # Update the board up to the last position step
-                new_board = _update_board_move(board, pos_steps)
-
-                # Check remaining capturing moves
-                pos_capt = _next_capt(new_board, pos_steps[-1])
-                if pos_capt == []:
-                    moves_capt += [pos_steps]
-                else:
-                    mv_queue += [pos_steps + [p] for p in pos_capt]
-
-        # Retrieve non capturing positions
-        if moves_capt == [] and all_moves:
-            pos_non_capt = _next_non_capt(board, disc_pos)
-            moves_non_capt += [[disc_pos, p] for p in pos_non_capt]
-
-    # Update the final moves
-    if all_moves:
-        moves = moves_non_capt if moves_capt == [] else moves_capt
-    else:
-        moves = moves_capt
+###############################################################################
 
-    return moves
+# Boards in use, so that identical boards are a single object
+_boards = weakref.WeakValueDictionary()
+
+class Board(object):
+    """
+        Immutable board, accepted everywhere a list of strings is. Identical
+        boards are interned: Board(rows) returns the existing instance while
+        it is alive, so the data derived from a board, computed on first use,
+        is shared by all its users.
+
+        Arguments:
+        - rows: the content of the board, as a list of strings or a Board
+    """
+    __slots__ = ("rows", "_hash", "_bits", "_counts", "_moves", \
+        "__weakref__")
+
+    def __new__(cls, rows):
+        if isinstance(rows, Board):
+            return rows
+        rows = tuple(rows)
+        board = _boards.get(rows)
+        if board is None:
+            board = object.__new__(cls)
+            object.__setattr__(board, "rows", rows)
+            object.__setattr__(board, "_hash", hash(rows))
+            object.__setattr__(board, "_bits", None)
+            object.__setattr__(board, "_counts", None)
+            object.__setattr__(board, "_moves", {})
+            _boards[rows] = board
+        return board
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Board is immutable")
+
+    def __reduce__(self):
+        return Board, (list(self.rows),)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self.rows[i])
+        return self.rows[i]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, Board):
+            return self is other or self.rows == other.rows
+        if isinstance(other, (list, tuple)):
+            return self.rows == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return "Board(%r)" % (list(self.rows),)
+
+    @property
+    def layout(self):
+        """
+            The _Layout of the board size.
+        """
+        return _layout(len(self.rows))
+
+    @property
+    def bits(self):
+        """
+            The (black, white, kings) masks.
+        """
+        if self._bits is None:
+            object.__setattr__(self, "_bits", _board_to_bits(self.rows))
+        return self._bits
+
+    def count(self, color, kings=False):
+        """
+            Arguments:
+            - color: the color of the discs
+            - kings: whether to only count the kings
+
+            Return value:
+            - n: the number of discs, or kings, of the color
+        """
+        if self._counts is None:
+            black, white, kings_mask = self.bits
+            object.__setattr__(self, "_counts", {
+                ("b", False): _popcount(black),
+                ("b", True): _popcount(black & kings_mask),
+                ("w", False): _popcount(white),
+                ("w", True): _popcount(white & kings_mask)})
+        return self._counts[(color, kings)]
+
+    def moves(self, color, all_moves=True):
+        """
+            Arguments:
+            - color:     the next player's color
+            - all_moves: whether to return all the moves or only the capturing
+                         ones, see allowed_moves()
+
+            Return value:
+            - moves: tuple of the valid moves, as tuples of squares
+        """
+        moves = self._moves.get((color, all_moves))
+        if moves is None:
+            layout = self.layout
+            moves = self._moves[(color, all_moves)] = tuple( \
+                tuple(_move_path(m, layout)) \
+                for m in _gen_moves(self.bits, color, all_moves, layout))
+        return moves
+
+    def after(self, move):
+        """
+            Arguments:
+            - move: list of the squares visited by the moved disc
+
+            Return value:
+            - board: the Board after the move
+        """
+        return Board(_update_board_move(list(self.rows), move))
 
 ###############################################################################
 
-def _get_unprotected_score(board, color):
+def _unprotected(men, empty, color, layout=_LAYOUT):
     """
-        Compute the number of unprotected disks of the given color considering
-        that a disk is worth one point if let completely unprotected and a half
-        otherwise.
+        Count the empty squares just behind the discs of a color, the discs in
+        the back row being automatically protected.
 
         Arguments:
-        - board: the content of the board
-        - color: the color of the player
+        - men:    the mask of the discs, without the kings
+        - empty:  the mask of the empty squares
+        - color:  the color of the discs
+        - layout: the _Layout of the board size
 
-        Retur value:
-        - score: score corresponding to the unprotected discs
+        Return value:
+        - n: the number of empty squares behind the discs
     """
-    # Retrieve discs position
-    discs_pos = _get_color_discs(board, color)
+    men &= layout.front_rows[color]
+    left, right = layout.king_dirs[3], layout.king_dirs[2]
+    if color == "b":
+        return _popcount(men & (empty << left)) + \
+            _popcount(men & (empty << right))
+    return _popcount(men & (empty >> left)) + _popcount(men & (empty >> right))
 
-    # Define forward direction and back row
-    bck_row = 0 if color == "b" else 7
-    fwd_dir = 1 if color == "b" else -1
+###############################################################################
 
-    # Loop through all positions
-    score = 0
-    for disc_pos in discs_pos:
-        row, col = disc_pos
+def _eval_terms(pos, layout=_LAYOUT):
+    """
+        Compute the material and king centering terms of the evaluation of a
+        position.
 
-        # Discs in the back row are automatically protected
-        if row == bck_row or board[row][col] == color.upper():
-            continue
+        Arguments:
+        - pos:    the (black, white, kings) masks
+        - layout: the _Layout of the board size
 
-        # Check left then right
-        score += 0.5 if col > 0 and board[row - fwd_dir][col - 1] == "_" else 0
-        score += 0.5 if col < 7 and board[row - fwd_dir][col + 1] == "_" else 0
+        Return value:
+        - terms: tuple of the numbers of black discs and kings, of white discs
+                 and kings, and of the black and white king centering scores
+    """
+    black, white, kings = pos
 
-    return score
+    # Number of kings on the midle
+    b_cntr = w_cntr = 0
+    for weight, rows in layout.center_rows:
+        b_cntr += _popcount(black & kings & rows) * weight
+        w_cntr += _popcount(white & kings & rows) * weight
 
+    return _popcount(black & ~kings), _popcount(black & kings), \
+        _popcount(white & ~kings), _popcount(white & kings), b_cntr, w_cntr
+
+###############################################################################
+
+def _score_terms(terms, unprotected, our_color):
+    """
+        Combine the terms of the evaluation, see _eval_board().
+
+        Arguments:
+        - terms:       the terms computed by _eval_terms()
+        - unprotected: the number of empty squares behind our discs
+        - our_color:   the color of our AI
+
+        Return value:
+        - score: the board value, higher is better
+    """
+    if our_color == "b":
+        our_discs, our_kings, their_discs, their_kings, middle_king, _ = terms
+    else:
+        their_discs, their_kings, our_discs, our_kings, _, middle_king = terms
+
+    # Discs out of the back row count half a point per empty square behind
+    unprotected = 0.5 * unprotected
+
+    # Update the scores
+    our_score = our_kings * KING_VAL + our_discs * DISC_VAL +\
+        middle_king * CNTR_VAL + unprotected * UNPD_VAL
+    their_score = their_kings * KING_VAL + their_discs * DISC_VAL
+
+    return our_score - their_score
+
+###############################################################################
+
+def _eval_bits(pos, our_color, layout=_LAYOUT):
+    """
+        Bitboard version of _eval_board(), see its documentation.
+
+        Arguments:
+        - pos:       the (black, white, kings) masks
+        - our_color: the color of our AI
+        - layout:    the _Layout of the board size
+
+        Return value:
+        - score: the board value, higher is better
+    """
+    black, white, kings = pos
+    ours = black if our_color == "b" else white
+    unprotected = _unprotected(ours & ~kings, layout.valid & ~(black | white), \
+        our_color, layout)
+    return _score_terms(_eval_terms(pos, layout), unprotected, our_color)
 
 ###############################################################################
 
@@ -283,7 +1096,8 @@ def _eval_board(board, our_color):
         AI on the other hand we will use:
             - number of kings and discs
             - king centering
-            - disc protection
+            - disc protection: a disc out of our back row is worth one point if
+              let completely unprotected and a half otherwise
 
         Arguments:
         - board: the content of the board
@@ -292,43 +1106,167 @@ def _eval_board(board, our_color):
         Return value:
         - score: the board value, higher is better
     """
-    their_color = "b" if our_color == "w" else "w"
+    return _eval_bits(_board_to_bits(board), our_color, _layout(len(board)))
 
-    # Values used for positions
-    DISC_VAL = 1        # Value of a normal disc
-    KING_VAL = 3        # King
-    CNTR_VAL = 0.01     # King in the midle
-    UNPD_VAL = 0.5      # Unprotected score
+###############################################################################
+#
+# Batch evaluation
+#
+# Scores many boards with one call using NumPy, which is only needed by these
+# functions. A batch is an (N, size, size) int8 array of the squares, see
+# _BATCH_CODES.
+#
+###############################################################################
 
-    # Initialize variables
-    our_kings   = 0;            their_kings = 0
-    our_discs   = 0;            their_discs = 0
-    middle_king = 0
-    unprotected = _get_unprotected_score(board, our_color)
+# Code of each disc in a batch, the other squares being 0
+_BATCH_CODES = {"b": 1, "B": 2, "w": -1, "W": -2}
 
-    # Go through all lines from our back to our front
-    for row in range(0, 8):
-        line = board[row]
+def boards_to_batch(boards):
+    """
+        Convert boards to a batch.
 
-        # Number of kings and normal discs
-        our_kings += line.count(our_color.upper())
-        our_discs += line.count(our_color)
-        their_kings += line.count(their_color.upper())
-        their_discs += line.count(their_color)
+        Arguments:
+        - boards: list of boards of the same size, as lists of strings
 
-        # Number of kings on the midle
-        middle_king += line.count(our_color.upper()) * \
-            (3.5 - abs(row - 3.5))
+        Return value:
+        - batch: (N, size, size) int8 array of the disc codes
+    """
+    import numpy as np
+    size = len(boards[0]) if len(boards) else 8
+    codes = np.zeros(256, dtype=np.int8)
+    for c, code in _BATCH_CODES.items():
+        codes[ord(c)] = code
+    text = "".join("".join(board) for board in boards).encode("latin-1")
+    return codes[np.frombuffer(text, dtype=np.uint8)].reshape( \
+        (len(boards), size, size))
+
+def eval_boards(batch, our_color):
+    """
+        Vectorized version of _eval_board(), see its documentation.
 
-    # Update the scores
-    our_score = our_kings * KING_VAL + our_discs * DISC_VAL +\
+        Arguments:
+        - batch:     (N, size, size) array of disc codes, see boards_to_batch(),
+                     or list of boards
+        - our_color: the color of our AI
+
+        Return value:
+        - scores: (N,) float64 array of the board values, equal to the ones
+                  of _eval_board()
+    """
+    import numpy as np
+    if not isinstance(batch, np.ndarray):
+        batch = boards_to_batch(batch)
+    size = batch.shape[1]
+    middle = (size - 1) / 2.0
+    empty = batch == 0
+    men = {"b": batch == 1, "w": batch == -1}
+    kings = {"b": batch == 2, "w": batch == -2}
+    their_color = "w" if our_color == "b" else "b"
+
+    # Kings in the middle, rows at the same distance being counted together
+    # as by _eval_terms()
+    king_rows = kings[our_color].sum(axis=2)
+    middle_king = np.zeros(len(batch))
+    for r in range(0, size // 2):
+        middle_king += (king_rows[:, r] + king_rows[:, size - 1 - r]) * \
+            (middle - abs(r - middle))
+
+    # Empty squares behind our men out of the back row, see _unprotected()
+    if our_color == "b":
+        ahead, behind = men["b"][:, 1:], empty[:, :-1]
+    else:
+        ahead, behind = men["w"][:, :-1], empty[:, 1:]
+    unprotected = (ahead[:, :, 1:] & behind[:, :, :-1]).sum(axis=(1, 2)) + \
+        (ahead[:, :, :-1] & behind[:, :, 1:]).sum(axis=(1, 2))
+    unprotected = 0.5 * unprotected
+
+    our_score = kings[our_color].sum(axis=(1, 2)) * KING_VAL + \
+        men[our_color].sum(axis=(1, 2)) * DISC_VAL + \
         middle_king * CNTR_VAL + unprotected * UNPD_VAL
-    their_score = their_kings * KING_VAL + their_discs * DISC_VAL
+    their_score = kings[their_color].sum(axis=(1, 2)) * KING_VAL + \
+        men[their_color].sum(axis=(1, 2)) * DISC_VAL
 
     return our_score - their_score
 
 ###############################################################################
 
+def _last_eval_position(pos, our_color, search=None, alpha=-_INFINITY, \
+        beta=_INFINITY, depth=None):
+    """
+        Position version of _last_eval_board(), see its documentation. The
+        capturing moves are searched with alpha-beta pruning, the biggest
+        captures first. Captures are compulsory so a player cannot stand pat
+        on the static evaluation while a capture is pending, except after
+        depth captures, which bounds the worst case.
+
+        Arguments:
+        - pos:       the Position, left unchanged
+        - our_color: the color of our AI
+        - search:    the search state counting the nodes and enforcing the
+                     deadline, if any
+        - alpha:     score we are already guaranteed to reach
+        - beta:      score they are already guaranteed to hold us to
+        - depth:     number of captures still allowed, QS_DEPTH by default
+
+        Return value:
+        - best_score: the score of the position, a bound if out of
+                      ]alpha, beta[
+    """
+    stats = None
+    if search is not None:
+        _count_node(search)
+        stats = search.stats
+        if search.endgame is not None:
+            score = _probe_endgame(search, pos)
+            if score is not None:
+                return score
+    if depth is None:
+        depth = QS_DEPTH
+
+    # Initialize variables
+    player_color = pos.turn
+
+    if depth == 0:
+        next_moves = ()
+    elif stats is None:
+        next_moves = pos.moves(False)
+    else:
+        next_moves = stats.gen_moves(pos, None, False)
+    if not next_moves:
+        return pos.evaluate(our_color) if stats is None else \
+            stats.evaluate(pos, our_color)
+
+    # Capture the most valuable discs first
+    if len(next_moves) > 1:
+        kings = pos.kings
+        next_moves = sorted(next_moves, reverse=True, key=lambda m: \
+            _popcount(m[1]) * DISC_VAL + _popcount(m[1] & kings) * \
+            (KING_VAL - DISC_VAL))
+
+    # Go through all moves and recursively find the best
+    best_score = None
+    for next_move in next_moves:
+        # Update the board, compute the score and restore the board
+        undo = pos.make_move(next_move)
+        score = _last_eval_position(pos, our_color, search, alpha, beta, \
+            depth - 1)
+        pos.unmake_move(undo)
+
+        # Update the score and the window depending on the player color
+        if player_color == our_color:
+            if best_score is None or score > best_score:
+                best_score = score
+                alpha = max(alpha, score)
+        elif best_score is None or score < best_score:
+            best_score = score
+            beta = min(beta, score)
+        if alpha >= beta:
+            break
+
+    return best_score
+
+###############################################################################
+
 def _last_eval_board(board, our_color, player_color):
     """
         Evaluate a board considering it's the last stage of the search tree.
@@ -344,87 +1282,1266 @@ def _last_eval_board(board, our_color, player_color):
         - best_score:   the score corresponding to the move that maximizes (or
                         minimizes) the score depending on the player color
     """
-    # Initialize variables
-    their_color = "w" if our_color == "b" else "b"
-    next_player_color = "w" if player_color == "b" else "b"
+    pos = Position.from_board(board, player_color)
+    return _last_eval_position(pos, our_color)
 
-    next_moves = allowed_moves(board, player_color, False)
-    if next_moves == []:
-        return _eval_board(board, our_color)
+###############################################################################
+
+# Bound types of the transposition table scores
+_EXACT, _LOWER, _UPPER = 1, 2, 3
+
+class TranspositionTable(object):
+    """
+        Fixed size hash table of search results indexed by Zobrist hash. Each
+        entry stores the hash, the searched depth, the score, the bound type
+        and the index of the best move in generation order, in preallocated
+        arrays so that the memory used never grows.
+
+        When two positions share a slot the entry is replaced either always,
+        or only if the new search is at least as deep as the stored one or the
+        stored one comes from a previous search ("depth" policy).
+
+        Counters of hits, misses and collisions (misses on a slot used by
+        another position) are kept for tuning.
+    """
+    ENTRY_SIZE = 22     # Bytes per entry: key, score, depth, bound, move, age
+
+    def __init__(self, size_mb=TT_SIZE_MB, replace=TT_REPLACE):
+        if replace not in ("depth", "always"):
+            raise ValueError("Unknown replacement policy: %s" % replace)
+        size = 1
+        while 2 * size * self.ENTRY_SIZE <= size_mb * 2 ** 20:
+            size *= 2
+        self.size = size
+        self.replace = replace
+        self.clear()
+
+    def new_search(self):
+        """
+            Age the stored entries so that the depth policy lets the next
+            search replace them.
+        """
+        self.age = (self.age + 1) % 256
+
+    def probe(self, key):
+        """
+            Look for a position.
+
+            Arguments:
+            - key: the Zobrist hash of the position
+
+            Return value:
+            - entry: (depth, score, bound, move index) or None if not found
+        """
+        i = key & (self.size - 1)
+        if self.bounds[i] and self.keys[i] == key:
+            self.hits += 1
+            return self.depths[i], self.scores[i], self.bounds[i], self.moves[i]
+        self.misses += 1
+        if self.bounds[i]:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        """
+            Record the result of a search.
+
+            Arguments:
+            - key:   the Zobrist hash of the position
+            - depth: the searched depth
+            - score: the score found
+            - bound: _EXACT, _LOWER or _UPPER
+            - move:  index of the best move in generation order
+        """
+        i = key & (self.size - 1)
+        if self.replace == "depth" and self.bounds[i] and \
+                self.ages[i] == self.age and self.keys[i] != key and \
+                self.depths[i] > depth:
+            return
+        self.stores += 1
+        self.keys[i] = key
+        self.scores[i] = score
+        self.depths[i] = depth
+        self.bounds[i] = bound
+        self.moves[i] = move
+        self.ages[i] = self.age
+
+    def clear(self):
+        """
+            Remove all the entries and reset the counters.
+        """
+        size = self.size
+        self.keys = array(_HASH_TYPECODE, [0]) * size
+        self.scores = array("d", [0]) * size
+        self.depths = array("h", [0]) * size
+        self.bounds = array("B", [0]) * size
+        self.moves = array("H", [0]) * size
+        self.ages = array("B", [0]) * size
+        self.age = 0
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def stats(self):
+        """
+            Return value:
+            - stats: dictionary of the table counters
+        """
+        used = sum(1 for b in self.bounds if b)
+        return {"size": self.size, "used": used, "hits": self.hits,
+            "misses": self.misses, "collisions": self.collisions,
+            "stores": self.stores}
+
+_table = None
+
+# Worker processes of the parallel search and their number
+_pool = None
+_pool_workers = 0
+
+def transposition_table():
+    """
+        Return value:
+        - table: the transposition table shared by the successive calls to
+                 play(), created on first use
+    """
+    global _table
+    if _table is None:
+        _table = TranspositionTable()
+    return _table
+
+###############################################################################
+#
+# Endgame table
+#
+# One byte per position with few discs on the dark squares, for each side to
+# move: 0 for a slot which is not a valid position, 1 for a draw and 2 + n
+# when the game ends after n moves, won by the side to move if n is odd and
+# lost if n is even.
+#
+# The positions are grouped by material, the number of black men, black kings,
+# white men and white kings, in a fixed order. Inside a group, the squares of
+# each kind of disc are ranked with the combinatorial number system.
+#
+###############################################################################
+
+_DARK_BITS = [s[0] for s in _LAYOUT.squares if (s[1] + s[2]) % 2 == 1]
+_DARK = sum(1 << b for b in _DARK_BITS)
+_DARK_INDEX = dict((b, i) for i, b in enumerate(_DARK_BITS))
+
+_BINOMIAL = [[0] * 5 for _ in range(0, len(_DARK_BITS) + 1)]
+for _n in range(0, len(_DARK_BITS) + 1):
+    for _k in range(0, 5):
+        if _k == 0:
+            _BINOMIAL[_n][_k] = 1
+        elif _n > 0:
+            _BINOMIAL[_n][_k] = _BINOMIAL[_n - 1][_k - 1] + \
+                _BINOMIAL[_n - 1][_k]
+
+_ENDGAME_MAGIC = b"CKTB"
+_ENDGAME_HEADER = 8
+
+def _endgame_layout(pieces):
+    """
+        Compute where each material group lies in an endgame table.
+
+        Arguments:
+        - pieces: maximum number of discs, at most 4
+
+        Return value:
+        - layout: dict of (offset, size) by (black men, black kings, white
+                  men, white kings)
+        - size:   total number of slots
+    """
+    layout = {}
+    size = 0
+    squares = len(_DARK_BITS)
+    for total in range(1, pieces + 1):
+        for bm in range(0, total + 1):
+            for bk in range(0, total + 1 - bm):
+                for wm in range(0, total + 1 - bm - bk):
+                    wk = total - bm - bk - wm
+                    group = 2
+                    for n in (bm, bk, wm, wk):
+                        group *= _BINOMIAL[squares][n]
+                    layout[(bm, bk, wm, wk)] = (size, group)
+                    size += group
+    return layout, size
+
+def _rank(mask):
+    """
+        Rank a set of dark squares in the combinatorial number system.
+    """
+    rank = 0
+    i = 1
+    while mask:
+        low = mask & -mask
+        rank += _BINOMIAL[_DARK_INDEX[low.bit_length() - 1]][i]
+        mask ^= low
+        i += 1
+    return rank
+
+###############################################################################
+
+class EndgameTable(object):
+    """
+        Read only endgame table, memory mapped so that the processes playing
+        in parallel share its pages.
+    """
+    def __init__(self, path=None):
+        import mmap
+        self.path = ENDGAME_PATH if path is None else path
+        with open(self.path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[0:4] != _ENDGAME_MAGIC:
+            raise ValueError("Not an endgame table: %s" % self.path)
+        self.pieces = ord(self.data[4:5])
+        self.layout, size = _endgame_layout(self.pieces)
+        if len(self.data) != _ENDGAME_HEADER + size:
+            raise ValueError("Truncated endgame table: %s" % self.path)
+
+    @staticmethod
+    def index(layout, black, white, kings, turn):
+        """
+            Compute the slot of a position.
+
+            Arguments:
+            - layout: the layout of the table, see _endgame_layout()
+            - black, white, kings: the masks of the position
+            - turn:   the color of the next player
+
+            Return value:
+            - index: the slot of the position, None if it is not covered
+        """
+        if (black | white) & ~_DARK:
+            return None
+        masks = (black & ~kings, black & kings, white & ~kings, white & kings)
+        group = layout.get(tuple(_popcount(m) for m in masks))
+        if group is None:
+            return None
+
+        index = 0
+        for mask in masks:
+            index = index * _BINOMIAL[len(_DARK_BITS)][_popcount(mask)] + \
+                _rank(mask)
+        return group[0] + 2 * index + (turn == "w")
+
+    def probe(self, pos):
+        """
+            Look for a position.
+
+            Arguments:
+            - pos: the Position
+
+            Return value:
+            - value: the stored byte, None if the position is not covered
+        """
+        if _popcount(pos.black | pos.white) > self.pieces or \
+                pos.layout is not _LAYOUT:
+            return None
+        i = EndgameTable.index(self.layout, pos.black, pos.white, pos.kings, \
+            pos.turn)
+        if i is None:
+            return None
+        value = ord(self.data[_ENDGAME_HEADER + i:_ENDGAME_HEADER + i + 1])
+        return value or None
+
+    def score(self, pos, our_color):
+        """
+            Arguments:
+            - pos:       the Position
+            - our_color: the color of our AI
+
+            Return value:
+            - score: the exact score of the position, 0 for a draw and
+                     ENDGAME_WIN minus the number of moves to the end for a
+                     win, None if the position is not covered
+        """
+        value = self.probe(pos)
+        if value is None:
+            return None
+        if value == 1:
+            return 0
+        moves = value - 2
+        score = ENDGAME_WIN - moves
+        if (moves % 2 == 1) != (pos.turn == our_color):
+            score = -score
+        return score
+
+    def close(self):
+        self.data.close()
+
+# Endgame table shared by the successive calls to play(), False when there is
+# no table file
+_endgame = None
+
+def endgame_table():
+    """
+        Return value:
+        - table: the EndgameTable of ENDGAME_PATH, opened on first use, None
+                 if there is no such file
+    """
+    global _endgame
+    if _endgame is None:
+        _endgame = EndgameTable() if os.path.isfile(ENDGAME_PATH) else False
+    return _endgame or None
+
+###############################################################################
+#
+# Opening book
+#
+# Moves played in won games, indexed by the Zobrist hash of the position they
+# were played in, mixed with the board size. The file holds a header with the number of entries, then
+# the sorted hashes, the indexes of the moves in generation order and their
+# weights, each as a little endian array.
+#
+###############################################################################
+
+_BOOK_MAGIC = b"CKOB"
+_BOOK_HEADER = 8
+
+class OpeningBook(object):
+    """
+        Read only opening book, loaded in memory by opening_book() on first
+        use.
+    """
+    def __init__(self, path=None):
+        self.path = BOOK_PATH if path is None else path
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if data[0:4] != _BOOK_MAGIC:
+            raise ValueError("Not an opening book: %s" % self.path)
+        count = OpeningBook._array("I", data, 4, 1)[0]
+        offset = _BOOK_HEADER
+        self.keys = OpeningBook._array(_HASH_TYPECODE, data, offset, count)
+        offset += 8 * count
+        self.moves = OpeningBook._array("B", data, offset, count)
+        offset += count
+        self.weights = OpeningBook._array("H", data, offset, count)
+
+    @staticmethod
+    def _array(typecode, data, offset, count):
+        """
+            Read a little endian array from the file content.
+        """
+        values = array(typecode)
+        load = getattr(values, "frombytes", None) or values.fromstring
+        load(data[offset:offset + values.itemsize * count])
+        if len(values) != count:
+            raise ValueError("Truncated opening book")
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def key(pos, color, layout=_LAYOUT):
+        """
+            Arguments:
+            - pos:    the (black, white, kings) masks
+            - color:  the color of the next player
+            - layout: the _Layout of the board size
+
+            Return value:
+            - key: the Zobrist hash of the position on a board of this size
+        """
+        return _hash_bits(pos, color) ^ _ZOBRIST_SIZE[layout.size]
+
+    def candidates(self, board, color):
+        """
+            Look for a position.
+
+            Arguments:
+            - board: the content of the board
+            - color: the color of the next player
+
+            Return value:
+            - moves: list of (weight, bitboard move), empty when the position
+                     is not in the book
+        """
+        layout = _layout(len(board))
+        pos = _board_to_bits(board)
+        key = OpeningBook.key(pos, color, layout)
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return []
+
+        moves = _gen_moves(pos, color, True, layout)
+        candidates = []
+        while i < len(self.keys) and self.keys[i] == key:
+            if self.moves[i] < len(moves):
+                candidates.append((self.weights[i], moves[self.moves[i]]))
+            i += 1
+        return candidates
+
+    def move(self, board, color):
+        """
+            Arguments:
+            - board: the content of the board
+            - color: the color of the next player
+
+            Return value:
+            - move: the heaviest move of the position as a list of squares,
+                    None when the position is not in the book
+        """
+        candidates = self.candidates(board, color)
+        if candidates == []:
+            return None
+        best = max(candidates, key=lambda c: c[0])
+        return _move_path(best[1], _layout(len(board)))
+
+# Opening book shared by the successive calls to play(), False when there is
+# no book file
+_book = None
+
+def opening_book():
+    """
+        Return value:
+        - book: the OpeningBook of BOOK_PATH, loaded on first use, None if
+                there is no such file
+    """
+    global _book
+    if _book is None:
+        _book = OpeningBook() if os.path.isfile(BOOK_PATH) else False
+    return _book or None
+
+###############################################################################
+#
+# Analysis cache
+#
+# Root results of past searches in an SQLite database, so that they outlive
+# the process and are shared by all the processes playing on the machine. An
+# entry holds the searched depth, the index of the best move in generation
+# order and its score, and is tagged with the version of the evaluation which
+# produced it. Entries of other versions are never returned and are the first
+# ones evicted, then the least recently used ones.
+#
+###############################################################################
+
+# Version of the search results, to bump when they change for another reason
+# than the evaluation weights
+_ANALYSIS_FORMAT = 1
+
+# Number of stores between two checks of the size of the cache
+_ANALYSIS_EVICT_CHECK = 256
+
+def _analysis_version():
+    """
+        Return value:
+        - version: 32 bits number identifying the current evaluation weights
+    """
+    import zlib
+    weights = (_ANALYSIS_FORMAT, DISC_VAL, KING_VAL, CNTR_VAL, UNPD_VAL, \
+        QS_DEPTH, ENDGAME_WIN)
+    return zlib.crc32(repr(weights).encode("ascii")) & 0xffffffff
+
+class AnalysisCache(object):
+    """
+        Persistent cache of root search results, created if needed. Each
+        process, forked ones included, uses its own connection, and the
+        database is in WAL mode so that readers and writers do not block each
+        other.
+
+        Arguments:
+        - path:        the SQLite database file
+        - max_entries: number of entries above which the least recently used
+                       ones are evicted, the size being checked every
+                       _ANALYSIS_EVICT_CHECK stores
+    """
+    def __init__(self, path=ANALYSIS_PATH, max_entries=ANALYSIS_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = _analysis_version()
+        self.hits = self.misses = self.stores = 0
+        self._conn = None
+        self._pid = None
+        self._connection()
+
+    def _connection(self):
+        """
+            Return value:
+            - conn: the connection of the current process
+        """
+        if self._conn is None or self._pid != os.getpid():
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=30, \
+                isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS analysis (" \
+                "key INTEGER NOT NULL, version INTEGER NOT NULL, " \
+                "depth INTEGER NOT NULL, move INTEGER NOT NULL, " \
+                "score REAL NOT NULL, used REAL NOT NULL, " \
+                "PRIMARY KEY (key, version))")
+            conn.execute("CREATE INDEX IF NOT EXISTS analysis_used " \
+                "ON analysis (used)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @staticmethod
+    def key(pos, color, layout=_LAYOUT):
+        """
+            Arguments:
+            - pos:    the (black, white, kings) masks
+            - color:  the color of our AI, playing next
+            - layout: the _Layout of the board size
+
+            Return value:
+            - key: the Zobrist hash of the position for our color, as the
+                   signed 64 bits integer SQLite stores
+        """
+        key = _hash_bits(pos, color) ^ _ZOBRIST_VIEW[color] ^ \
+            _ZOBRIST_SIZE[layout.size]
+        return key - (1 << 64) if key >= 1 << 63 else key
+
+    def get(self, key):
+        """
+            Look for a position and mark it as recently used.
+
+            Arguments:
+            - key: the key of the position, see key()
+
+            Return value:
+            - entry: (depth, move index, score), None if not found
+        """
+        conn = self._connection()
+        entry = conn.execute("SELECT depth, move, score FROM analysis " \
+            "WHERE key = ? AND version = ?", (key, self.version)).fetchone()
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        conn.execute("UPDATE analysis SET used = ? WHERE key = ? AND " \
+            "version = ?", (time.time(), key, self.version))
+        return entry
+
+    def put(self, key, depth, move, score):
+        """
+            Record the result of a search, unless a deeper one is known.
+
+            Arguments:
+            - key:   the key of the position, see key()
+            - depth: the searched depth
+            - move:  index of the best move in generation order
+            - score: its score
+        """
+        conn = self._connection()
+        conn.execute("INSERT INTO analysis VALUES (?, ?, ?, ?, ?, ?) " \
+            "ON CONFLICT (key, version) DO UPDATE SET depth = excluded.depth, " \
+            "move = excluded.move, score = excluded.score, " \
+            "used = excluded.used WHERE excluded.depth >= analysis.depth", \
+            (key, self.version, depth, move, score, time.time()))
+        self.stores += 1
+        if self.stores % _ANALYSIS_EVICT_CHECK == 0:
+            self.evict()
+
+    def evict(self):
+        """
+            Remove the entries of other versions and the least recently used
+            ones above max_entries.
+        """
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute("DELETE FROM analysis WHERE rowid IN (SELECT rowid " \
+                "FROM analysis ORDER BY version = ?, used LIMIT ?)", \
+                (self.version, count - self.max_entries))
+
+    def stats(self):
+        """
+            Return value:
+            - stats: dictionary of the cache counters
+        """
+        entries = self._connection().execute( \
+            "SELECT COUNT(*) FROM analysis").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, \
+            "misses": self.misses, "stores": self.stores}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+# Analysis cache shared by the successive calls to play(), False when there
+# is no cache file
+_analysis = None
+
+def analysis_cache():
+    """
+        Return value:
+        - cache: the AnalysisCache of ANALYSIS_PATH, opened on first use, None
+                 if there is no such file
+    """
+    global _analysis
+    if _analysis is None:
+        _analysis = AnalysisCache() if os.path.isfile(ANALYSIS_PATH) else False
+    return _analysis or None
+
+###############################################################################
+
+class _SearchTimeout(Exception):
+    pass
+
+class _Search(object):
+    """
+        State shared by all the nodes of a search: the colors, the move
+        ordering heuristics with their killer and history tables, the number
+        of visited nodes, the deadline of the search and the transposition
+        table if any. With exact_depth, only the table entries of the searched
+        depth are used so that the scores are the ones of a plain minimax,
+        whatever the table contains. The SearchStats, if any, are filled as
+        the search goes. The EndgameTable, if any, gives the exact score of
+        the positions with few discs. The layout gives the board size. The
+        stop event, if any, abandons the search as the deadline does once set.
+    """
+    def __init__(self, our_color, ordering=None, deadline=None, table=None, \
+            exact_depth=False, stats=None, endgame=None, layout=_LAYOUT, \
+            stop=None):
+        self.our_color = our_color
+        self.their_color = "b" if our_color == "w" else "w"
+        self.ordering = MOVE_ORDERING if ordering is None else ordering
+        self.killers = {}
+        self.history = {}
+        self.nodes = 0
+        self.deadline = deadline
+        self.horizon = False
+        self.table = table
+        self.exact_depth = exact_depth
+        self.stats = stats
+        self.endgame = endgame
+        self.layout = layout
+        self.stop = stop
+
+        # The transposition table is shared by both colors, whose evaluations
+        # differ, and by all board sizes, so they are part of the hash
+        self.view = _ZOBRIST_VIEW[our_color] ^ _ZOBRIST_SIZE[layout.size]
+
+class SearchStats(object):
+    """
+        Statistics of a search, only gathered when an instance is given to
+        search_move() or play(), the search does not pay for them otherwise:
+        - nodes:      number of visited nodes per ply, 0 being the root
+        - qnodes:     number of nodes of the capture resolution at the leaves
+        - evals:      number of static evaluations
+        - movegens:   number of move generations
+        - cutoffs:    number of alpha-beta cutoffs
+        - tt_hits:    number of transposition table hits ending a node
+        - tb_hits:    number of endgame table hits
+        - iterations: (depth, nodes, seconds) of each completed iteration
+        - phases:     seconds spent in move generation, in evaluation and in
+                      the rest of the search. With several workers, the first
+                      two add up the time of all the processes.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.qnodes = 0
+        self.evals = 0
+        self.movegens = 0
+        self.cutoffs = 0
+        self.tt_hits = 0
+        self.tb_hits = 0
+        self.iterations = []
+        self.phases = {"movegen": 0.0, "eval": 0.0, "search": 0.0}
+        self._expanded = 0
+        self._children = 0
+
+    def gen_moves(self, pos, ply, all_moves=True):
+        """
+            Position.moves() counting a node at the given ply, None for a
+            capture resolution node.
+        """
+        start = time.time()
+        moves = pos.moves(all_moves)
+        self.phases["movegen"] += time.time() - start
+        self.movegens += 1
+        if ply is None:
+            self.qnodes += 1
+        else:
+            self.nodes[ply] = self.nodes.get(ply, 0) + 1
+            if moves:
+                self._expanded += 1
+                self._children += len(moves)
+        return moves
+
+    def evaluate(self, pos, our_color):
+        """
+            Position.evaluate() counting the evaluation.
+        """
+        start = time.time()
+        score = pos.evaluate(our_color)
+        self.phases["eval"] += time.time() - start
+        self.evals += 1
+        return score
+
+    def branching(self):
+        """
+            Return value:
+            - factor: average number of moves of the nodes which are not
+                      leaves of the game, outside the capture resolution
+        """
+        return self._children / float(self._expanded) if self._expanded \
+            else 0.0
+
+    def merge(self, other):
+        """
+            Add the counts of another SearchStats, such as the one of a worker.
+        """
+        for ply, nodes in other.nodes.items():
+            self.nodes[ply] = self.nodes.get(ply, 0) + nodes
+        for name in ("qnodes", "evals", "movegens", "cutoffs", "tt_hits", \
+                "tb_hits", "_expanded", "_children"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ("movegen", "eval"):
+            self.phases[name] += other.phases[name]
+
+    def as_dict(self):
+        """
+            Return value:
+            - stats: the statistics as a JSON serializable dict
+        """
+        return {
+            "nodes": [self.nodes.get(p, 0) for p in \
+                range(0, max(self.nodes) + 1 if self.nodes else 0)],
+            "qnodes": self.qnodes,
+            "evals": self.evals,
+            "movegens": self.movegens,
+            "cutoffs": self.cutoffs,
+            "tt_hits": self.tt_hits,
+            "tb_hits": self.tb_hits,
+            "branching": self.branching(),
+            "iterations": [list(i) for i in self.iterations],
+            "phases": dict(self.phases),
+        }
+
+# Result of search_move(): the best move as a list of squares, its score, the
+# depth of the last completed iteration (-1 if none completed in time, the move
+# is then the first one in heuristic order), the number of nodes and the
+# duration in seconds
+SearchResult = namedtuple("SearchResult", "move score depth nodes time")
+
+###############################################################################
+
+def _count_node(search):
+    """
+        Count a visited node and periodically check the search deadline and
+        stop event.
+
+        Arguments:
+        - search: the search state
+
+        Raise _SearchTimeout once the deadline is passed or the search stopped.
+    """
+    search.nodes += 1
+    if search.nodes & _TIME_CHECK == 0 and ((search.deadline is not None \
+            and time.time() > search.deadline) or \
+            (search.stop is not None and search.stop.is_set())):
+        raise _SearchTimeout()
+
+def _probe_endgame(search, pos):
+    """
+        Look for a position in the endgame table of the search.
+
+        Arguments:
+        - search: the search state
+        - pos:    the Position
+
+        Return value:
+        - score: the exact score of the position, None if not covered
+    """
+    score = search.endgame.score(pos, search.our_color)
+    if score is not None and search.stats is not None:
+        search.stats.tb_hits += 1
+    return score
+
+###############################################################################
+
+def _order_moves(search, moves, color, ply, first=None):
+    """
+        Sort the moves so that the most promising ones are searched first, the
+        heuristics of search.ordering are applied in priority order:
+            - captures: capturing moves first
+            - length:   longest jump chains first
+            - killers:  moves which produced a cutoff at the same ply
+            - history:  moves which produced many cutoffs so far
+
+        Arguments:
+        - search: the search state
+        - moves:  the bitboard moves
+        - color:  the color of the moving player
+        - ply:    the distance to the root of the search
+        - first:  move to search before all the others, such as the best move
+                  of a previous search
+
+        Return value:
+        - moves: the sorted moves, ties keep the generation order
+    """
+    if len(moves) < 2 or (not search.ordering and first is None):
+        return moves
+
+    killers = search.killers.get(ply, ())
+    history = search.history
+    keys = {
+        "captures": lambda m: m[1] != 0,
+        "length":   lambda m: len(m[0]),
+        "killers":  lambda m: m[0] in killers,
+        "history":  lambda m: history.get((color, m[0][0], m[0][-1]), 0),
+    }
+    keys = [keys[h] for h in search.ordering]
+
+    moves = sorted(moves, key=lambda m: [k(m) for k in keys], reverse=True)
+    if first is not None:
+        moves.remove(first)
+        moves.insert(0, first)
+
+    return moves
+
+###############################################################################
+
+def _record_cutoff(search, move, color, ply, depth):
+    """
+        Update the killer and history tables with a move producing a cutoff.
+
+        Arguments:
+        - search: the search state
+        - move:   the bitboard move
+        - color:  the color of the moving player
+        - ply:    the distance to the root of the search
+        - depth:  the remaining depth of the search
+    """
+    if search.stats is not None:
+        search.stats.cutoffs += 1
+
+    path = move[0]
+    killers = search.killers.setdefault(ply, [])
+    if path not in killers:
+        killers.insert(0, path)
+        del killers[2:]
+
+    key = (color, path[0], path[-1])
+    search.history[key] = search.history.get(key, 0) + (depth + 1) ** 2
+
+###############################################################################
+
+def _probe(search, key, moves, depth, alpha, beta):
+    """
+        Look for the node in the transposition table.
+
+        Arguments:
+        - search: the search state
+        - key:    the Zobrist hash of the node
+        - moves:  the moves of the node in generation order
+        - depth:  number of moves to see in the futur
+        - alpha:  score we are already guaranteed to reach
+        - beta:   score they are already guaranteed to hold us to
+
+        Return value:
+        - score: the stored score if it is enough to conclude, None otherwise
+        - move:  the stored best move, None if unknown
+    """
+    entry = search.table.probe(key) if search.table is not None else None
+    if entry is None:
+        return None, None
+
+    stored_depth, score, bound, index = entry
+    move = moves[index] if index < len(moves) else None
+    # Deeper results are better estimates, but they differ from the result of
+    # a search at the requested depth, which exact_depth searches must return
+    usable = stored_depth == depth or \
+        (stored_depth > depth and not search.exact_depth)
+    if usable and (bound == _EXACT or (bound == _LOWER and score >= beta) \
+            or (bound == _UPPER and score <= alpha)):
+        # The stored search may have stopped at its own depth limit
+        search.horizon = True
+        if search.stats is not None:
+            search.stats.tt_hits += 1
+        return score, move
+
+    return None, move
+
+###############################################################################
+
+def _store(search, key, moves, depth, alpha, beta, score, move):
+    """
+        Record the result of a node in the transposition table.
+
+        Arguments:
+        - search: the search state
+        - key:    the Zobrist hash of the node
+        - moves:  the moves of the node in generation order
+        - depth:  number of moves to see in the futur
+        - alpha:  lower bound of the search window of the node
+        - beta:   upper bound of the search window of the node
+        - score:  the score found
+        - move:   the best move found
+    """
+    if search.table is None:
+        return
+    if score <= alpha:
+        bound = _UPPER
+    elif score >= beta:
+        bound = _LOWER
     else:
-        # Initialize variables
-        best_score = None
+        bound = _EXACT
+    search.table.store(key, depth, score, bound, moves.index(move))
 
-        # Go through all moves and recursively find the best
-        for next_move in next_moves:
-            # Update the board
-            new_board = _update_board_move(board, next_move)
+###############################################################################
 
-            # Compute best move and score
-            score = _last_eval_board(new_board, our_color, next_player_color)
+def _search_ours(search, pos, depth, alpha, beta, ply):
+    """
+        Alpha-beta search of a node where we are playing, the score is the
+        highest one we can reach against their best replies.
 
-            # Update the score depending on the player color
-            if best_score == None:
-                best_score = score
-            elif player_color == our_color and score > best_score:
-                best_score = score
-            elif player_color == their_color and score < best_score:
-                best_score = score
+        Arguments:
+        - search: the search state
+        - pos:    the Position, left unchanged
+        - depth:  number of moves to see in the futur
+        - alpha:  score we are already guaranteed to reach
+        - beta:   score they are already guaranteed to hold us to
+        - ply:    the distance to the root of the search
+
+        Return value:
+        - best_move:  our best bitboard move, None if we are stuck
+        - best_score: corresponding score, a bound if out of ]alpha, beta[
+    """
+    _count_node(search)
+    if search.endgame is not None:
+        score = _probe_endgame(search, pos)
+        if score is not None:
+            return None, score
+    our_color = search.our_color
+    stats = search.stats
+    moves = pos.moves() if stats is None else stats.gen_moves(pos, ply)
+    if not moves:
+        return None, pos.evaluate(our_color) if stats is None else \
+            stats.evaluate(pos, our_color)
+
+    key = pos.key ^ search.view
+    score, first = _probe(search, key, moves, depth, alpha, beta)
+    if score is not None:
+        return first, score
+
+    alpha_init = alpha
+    best_move = None
+    best_score = None
+    for move in _order_moves(search, moves, our_color, ply, first):
+        undo = pos.make_move(move)
+        score = _search_theirs(search, pos, depth, alpha, beta, ply + 1)
+        pos.unmake_move(undo)
+
+        # Check if we can play better which means increasing the score
+        if best_move is None or score > best_score:
+            best_move = move
+            best_score = score
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                _record_cutoff(search, move, our_color, ply, depth)
+                break
+
+    _store(search, key, moves, depth, alpha_init, beta, best_score, best_move)
+    return best_move, best_score
 
+###############################################################################
+
+def _search_theirs(search, pos, depth, alpha, beta, ply):
+    """
+        Alpha-beta search of a node where they are playing, the score is the
+        lowest one they can hold us to.
+
+        Arguments:
+        - search: the search state
+        - pos:    the Position, left unchanged
+        - depth:  number of moves to see in the futur
+        - alpha:  score we are already guaranteed to reach
+        - beta:   score they are already guaranteed to hold us to
+        - ply:    the distance to the root of the search
+
+        Return value:
+        - best_score: the score of their best reply, a bound if out of
+                      ]alpha, beta[
+    """
+    _count_node(search)
+    if search.endgame is not None:
+        score = _probe_endgame(search, pos)
+        if score is not None:
+            return score
+    our_color = search.our_color
+    their_color = search.their_color
+    stats = search.stats
+    moves = pos.moves() if stats is None else stats.gen_moves(pos, ply)
+    if not moves:
+        return pos.evaluate(our_color) if stats is None else \
+            stats.evaluate(pos, our_color)
+
+    key = pos.key ^ search.view
+    score, first = _probe(search, key, moves, depth, alpha, beta)
+    if score is not None:
+        return score
+
+    beta_init = beta
+    best_move = None
+    best_score = None
+    for move in _order_moves(search, moves, their_color, ply, first):
+        undo = pos.make_move(move)
+        if depth > 0:
+            _, score = _search_ours(search, pos, depth - 1, alpha, beta, \
+                ply + 1)
+        else:
+            search.horizon = True
+            score = _last_eval_position(pos, our_color, search, alpha, beta)
+        pos.unmake_move(undo)
+
+        # Check if they can play better which means decreasing the score
+        if best_score is None or score < best_score:
+            best_move = move
+            best_score = score
+            beta = min(beta, score)
+            if alpha >= beta:
+                _record_cutoff(search, move, their_color, ply, depth)
+                break
+
+    _store(search, key, moves, depth, alpha, beta_init, best_score, best_move)
     return best_score
 
 ###############################################################################
 
-def _find_best_move(board, our_color, depth):
+def _search_bits(search, pos, depth, first=None):
+    """
+        Search the root node. Moves are searched in the heuristic order but the
+        move returned is the one a plain minimax would return: among moves with
+        the same score, the first one in generation order.
+
+        Arguments:
+        - search: the search state
+        - pos:    the (black, white, kings) masks
+        - depth:  number of moves to see in the futur
+        - first:  move to search first, such as the previous iteration best
+
+        Return value:
+        - our_bst_mv:   our bitboard move to maximize score, None if stuck
+        - our_bst_scr:  corresponding score
+    """
+    _count_node(search)
+    our_color = search.our_color
+    stats = search.stats
+    pos = Position(pos, our_color, search.layout)
+    moves = pos.moves() if stats is None else stats.gen_moves(pos, 0)
+    if not moves:
+        return None, pos.evaluate(our_color) if stats is None else \
+            stats.evaluate(pos, our_color)
+
+    key = pos.key ^ search.view
+    if first is None:
+        _, first = _probe(search, key, moves, depth, -_INFINITY, _INFINITY)
+
+    index = dict((m, i) for i, m in enumerate(moves))
+    our_bst_mv = None
+    our_bst_scr = None
+    for move in _order_moves(search, moves, our_color, 0, first):
+        # A move generated before the best one wins ties, so its search window
+        # must include the best score
+        if our_bst_mv is None:
+            alpha = -_INFINITY
+        elif index[move] < index[our_bst_mv]:
+            alpha = our_bst_scr - _TIE_MARGIN * (1 + abs(our_bst_scr))
+        else:
+            alpha = our_bst_scr
+
+        undo = pos.make_move(move)
+        score = _search_theirs(search, pos, depth, alpha, _INFINITY, 1)
+        pos.unmake_move(undo)
+
+        if our_bst_mv is None or score > our_bst_scr or (score == our_bst_scr \
+                and index[move] < index[our_bst_mv]):
+            our_bst_mv = move
+            our_bst_scr = score
+
+    _store(search, key, moves, depth, -_INFINITY, _INFINITY, our_bst_scr, \
+        our_bst_mv)
+    return our_bst_mv, our_bst_scr
+
+###############################################################################
+
+def _search_root_move(pos, color, move, depth, deadline, with_stats=False, \
+        with_endgame=False, size=8, alpha=-_INFINITY):
+    """
+        Search the subtree of a root move, in a worker process of the parallel
+        search. The worker transposition table is kept between calls but only
+        entries of the searched depth are used, so that the score does not
+        depend on the tasks the worker ran before.
+
+        Arguments:
+        - pos:      the (black, white, kings) masks of the root
+        - color:    the color of our AI
+        - move:     the root bitboard move
+        - depth:    number of moves to see in the futur
+        - deadline:   time at which the search is abandoned, None for no limit
+        - with_stats: whether to gather the SearchStats of the subtree
+        - with_endgame: whether to probe the endgame table of ENDGAME_PATH
+        - size:       the size of the board
+        - alpha:      score we are already guaranteed to reach at the root
+
+        Return value:
+        - score:   score of the move, exact if above alpha and an upper bound
+                   otherwise, None if the deadline was reached
+        - nodes:   number of visited nodes
+        - horizon: whether the search reached the depth limit
+        - stats:   the SearchStats of the subtree, None without with_stats
+    """
+    layout = _layout(size)
+    search = _Search(color, deadline=deadline, table=transposition_table(), \
+        exact_depth=True, stats=SearchStats() if with_stats else None, \
+        endgame=endgame_table() if with_endgame else None, layout=layout)
+    pos = Position(pos, color, layout)
+    pos.make_move(move)
+    try:
+        score = _search_theirs(search, pos, depth, alpha, _INFINITY, 1)
+    except _SearchTimeout:
+        score = None
+
+    return score, search.nodes, search.horizon, search.stats
+
+###############################################################################
+
+def _worker_pool(workers):
+    """
+        Return value:
+        - pool: a process pool of the given size, kept alive between calls so
+                that the workers and their transposition tables stay warm,
+                None if this Python cannot run one
+    """
+    global _pool, _pool_workers
+    if _pool is not None and _pool_workers != workers:
+        shutdown_workers()
+    if _pool is None:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+        except ImportError:
+            # Python 2 has no concurrent.futures
+            import warnings
+            warnings.warn("Parallel search needs concurrent.futures " \
+                "(Python 3), searching with a single process")
+            return None
+        _pool = ProcessPoolExecutor(workers)
+        _pool_workers = workers
+    return _pool
+
+def shutdown_workers():
+    """
+        Stop the worker processes of the parallel search, if any.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+###############################################################################
+
+def _search_split(search, pos, depth, first, workers):
+    """
+        Parallel version of _search_bits(). The first move is searched alone
+        with a full window, then the other ones by the worker processes, each
+        with the best score known when it is submitted as lower bound, as
+        _search_bits() does (young brothers wait). A move failing low cannot
+        beat the best one, and a move scoring above its bound has an exact
+        score, so the move returned is the same as the one of _search_bits()
+        whatever the order in which the workers complete.
+
+        Arguments:
+        - search:  the search state, which receives the nodes of the workers
+        - pos:     the (black, white, kings) masks
+        - depth:   number of moves to see in the futur
+        - first:   move to search first, such as the previous iteration best
+        - workers: number of worker processes
+
+        Return value:
+        - our_bst_mv:   our bitboard move to maximize score, None if stuck
+        - our_bst_scr:  corresponding score
+
+        Raise _SearchTimeout if a worker reached the deadline.
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+
+    _count_node(search)
+    our_color = search.our_color
+    stats = search.stats
+    moves = _gen_moves(pos, our_color, True, search.layout)
+    if stats is not None:
+        stats.movegens += 1
+        stats.nodes[0] = stats.nodes.get(0, 0) + 1
+    if not moves:
+        return None, _eval_bits(pos, our_color, search.layout)
+
+    pool = _worker_pool(workers)
+    index = dict((m, i) for i, m in enumerate(moves))
+    pending = _order_moves(search, moves, our_color, 0, first)
+    best = [None, None]
+
+    def submit(move):
+        # A move generated before the best one wins ties, so its search window
+        # must include the best score
+        our_bst_mv, our_bst_scr = best
+        if our_bst_mv is None:
+            alpha = -_INFINITY
+        elif index[move] < index[our_bst_mv]:
+            alpha = our_bst_scr - _TIE_MARGIN * (1 + abs(our_bst_scr))
+        else:
+            alpha = our_bst_scr
+        future = pool.submit(_search_root_move, pos, our_color, move, depth, \
+            search.deadline, stats is not None, search.endgame is not None, \
+            search.layout.size, alpha)
+        future.move, future.alpha = move, alpha
+        return future
+
+    # The best move found so far is the first one, as long as it is searched
+    # the other workers could only use an infinite bound
+    running = set([submit(pending[0])])
+    pending = pending[1:]
+    timeout = False
+    while running:
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            score, nodes, horizon, move_stats = future.result()
+            search.nodes += nodes
+            if move_stats is not None:
+                stats.merge(move_stats)
+            search.horizon = search.horizon or horizon
+            move = future.move
+            if score is None:
+                timeout = True
+            elif score > future.alpha and (best[0] is None or \
+                    score > best[1] or (score == best[1] and \
+                    index[move] < index[best[0]])):
+                best = [move, score]
+        while pending and not timeout and len(running) < workers:
+            running.add(submit(pending[0]))
+            pending = pending[1:]
+
+    if timeout:
+        raise _SearchTimeout()
+    return best[0], best[1]
+
+###############################################################################
+
+def _find_best_move(board, our_color, depth, ordering=None):
     """
         Recursively find the best move by maxmimzing the score with our move and
-        minimizing it with their move.
+        minimizing it with their move. Branches which cannot change the result
+        are pruned (alpha-beta), which is all the more efficient that the
+        best moves are searched first.
 
         Arguments:
         - board:        the content of the board
         - our_color:    the color of our AI
         - depth:        number of moves to see in the futur
+        - ordering:     move ordering heuristics, MOVE_ORDERING by default
 
         Return value:
         - our_bst_mv:   our move to maximize score
         - our_bst_scr:  corresponding score
     """
-    # Initialize variables
-    their_color = "b" if our_color == "w" else "w"
-    our_bst_mv = []
-    our_bst_scr = _eval_board(board, our_color)
-
-    # Go through all possible combination of our move and their move
-    our_moves = allowed_moves(board, our_color)
-    for our_move in our_moves:
-        new_board1 = _update_board_move(board, our_move)
-        their_moves = allowed_moves(new_board1, their_color)
-
-        # Initialize variables
-        their_bst_mv = []
-        their_bst_scr = _eval_board(new_board1, our_color)
-
-        # Go through each independent move
-        for their_move in their_moves:
-            new_board2 = _update_board_move(new_board1, their_move)
-
-            # Find the best move and record score
-            if depth > 0:
-                _, score = _find_best_move(new_board2, our_color, depth - 1)
-            else:
-                score = _last_eval_board(new_board2, our_color, our_color)
-
-            # Check if they can play better which means decreasing the score
-            if their_bst_mv == [] or score < their_bst_scr:
-                their_bst_scr = score
-                their_bst_mv = their_move
-
-        # Check if we can play better which means increasing the score
-        if our_bst_mv == [] or their_bst_scr > our_bst_scr:
-            our_bst_scr = their_bst_scr
-            our_bst_mv = our_move
-
-    return our_bst_mv, our_bst_scr
+    layout = _layout(len(board))
+    search = _Search(our_color, ordering, layout=layout)
+    move, score = _search_bits(search, _board_to_bits(board), depth)
+    return (_move_path(move, layout) if move is not None else []), score
 
 ###############################################################################
 
@@ -436,6 +2553,8 @@ def _number_disc(board):
         Return value:
         - n: number of discs
     """
+    if isinstance(board, Board):
+        return board.count("b") + board.count("w")
     n = 0
     for line in board:
         n += line.lower().count("b")
@@ -445,16 +2564,344 @@ def _number_disc(board):
 
 ###############################################################################
 
-def play(board, color):
+def search_move(board, color, time_limit=None, max_depth=None, table=None, \
+        workers=1, stats=None, endgame=None, stop=None, cache=None):
+    """
+        Iterative deepening search: the tree is searched at depth 0, 1, 2...
+        until the time budget is spent, and the best move of the last completed
+        iteration is kept. The moves ordering learnt by an iteration speeds up
+        the next one.
+
+        Arguments:
+        - board:      the content of the board
+        - color:      the color of our AI
+        - time_limit: time budget in seconds, None for no limit
+        - max_depth:  maximum depth to search, by default MAX_DEPTH when
+                      there is a time budget and 1 (2 with few discs)
+                      otherwise. It is never more than MAX_DEPTH.
+        - table:      the TranspositionTable to use, by default the one shared
+                      by all the calls so that a turn reuses the work of the
+                      previous ones
+        - workers:    number of processes searching the root moves in
+                      parallel, each one with its own transposition table. At
+                      a given depth the move found is the same as with a
+                      single process. Without concurrent.futures, as on
+                      Python 2, a single process searches with a warning.
+        - stats:      a SearchStats to fill, None to not gather statistics
+        - endgame:    the EndgameTable to probe, by default the one of
+                      ENDGAME_PATH if it exists, False to not use any
+        - stop:       a threading.Event ending the search like the time budget
+                      once set, it is not seen by the worker processes
+        - cache:      an AnalysisCache, if any. A cached result at max_depth
+                      or deeper is returned without searching, otherwise the
+                      search goes on from the cached depth and its result is
+                      stored.
+
+        Return value:
+        - result: a SearchResult, its move is [] when we cannot play
+    """
+    start = time.time()
+    pos = _board_to_bits(board)
+    if max_depth is None and time_limit is None:
+        max_depth = 1 if _number_disc(board) > 6 else 2
+    max_depth = MAX_DEPTH if max_depth is None else min(max_depth, MAX_DEPTH)
+    deadline = None if time_limit is None else start + time_limit
+    table = transposition_table() if table is None else table
+    table.new_search()
+    endgame = endgame_table() if endgame is None else endgame or None
+    layout = _layout(len(board))
+    search = _Search(color, deadline=deadline, table=table, stats=stats, \
+        endgame=endgame, layout=layout, stop=stop)
+
+    # A forced move does not need any search
+    moves = _gen_moves(pos, color, True, layout)
+    if len(moves) < 2:
+        move = _move_path(moves[0], layout) if moves else []
+        return SearchResult(move, _eval_bits(pos, color, layout), 0, 0, \
+            time.time() - start)
+
+    if workers > 1 and _worker_pool(workers) is None:
+        workers = 1
+
+    best_move = _order_moves(search, moves, color, 0)[0]
+    best_score, depth = None, -1
+    if cache is not None:
+        key = AnalysisCache.key(pos, color, layout)
+        entry = cache.get(key)
+        if entry is not None and entry[1] < len(moves):
+            best_move, best_score, depth = moves[entry[1]], entry[2], entry[0]
+        cached_depth = depth
+
+    while depth < max_depth:
+        iter_start = time.time()
+        search.horizon = False
+        try:
+            if workers > 1:
+                move, score = _search_split(search, pos, depth + 1, \
+                    best_move, workers)
+            else:
+                move, score = _search_bits(search, pos, depth + 1, best_move)
+        except _SearchTimeout:
+            break
+        best_move, best_score, depth = move, score, depth + 1
+        if stats is not None:
+            stats.iterations.append((depth, search.nodes, \
+                time.time() - iter_start))
+
+        # Stop when the whole tree was explored or when the next iteration,
+        # which is longer than this one, cannot be completed in time
+        now = time.time()
+        if not search.horizon or \
+                (deadline is not None and now + now - iter_start > deadline):
+            break
+
+    if cache is not None and depth > cached_depth:
+        cache.put(key, depth, moves.index(best_move), best_score)
+    elapsed = time.time() - start
+    if stats is not None:
+        stats.phases["search"] = max(0.0, elapsed - stats.phases["movegen"] \
+            - stats.phases["eval"])
+    return SearchResult(_move_path(best_move, layout), best_score, depth, \
+        search.nodes, elapsed)
+
+def principal_variation(board, color, move, table=None, length=None):
+    """
+        Follow the best moves stored in the transposition table by a search,
+        the line both players are expected to play.
+
+        Arguments:
+        - board:  the board which was searched
+        - color:  the color of our AI, which searched it
+        - move:   the move found by the search, first move of the line
+        - table:  the TranspositionTable of the search, by default the shared
+                  one
+        - length: maximum number of moves, unlimited by default
+
+        Return value:
+        - pv: list of the moves as lists of squares, starting with move. The
+              line stops at the first position missing from the table or
+              already seen in the line.
+    """
+    if move == []:
+        return []
+    layout = _layout(len(board))
+    table = transposition_table() if table is None else table
+    view = _ZOBRIST_VIEW[color] ^ _ZOBRIST_SIZE[layout.size]
+    pos = _board_to_bits(board)
+    moves = _gen_moves(pos, color, True, layout)
+    paths = [_move_path(m, layout) for m in moves]
+    bit_move = moves[paths.index([tuple(s) for s in move])]
+
+    pv = []
+    seen = set()
+    turn = color
+    while length is None or len(pv) < length:
+        pv.append(_move_path(bit_move, layout))
+        pos = _apply_move(pos, turn, bit_move)
+        turn = "w" if turn == "b" else "b"
+        key = _hash_bits(pos, turn) ^ view
+        entry = table.probe(key) if key not in seen else None
+        seen.add(key)
+        if entry is None:
+            break
+        moves = _gen_moves(pos, turn, True, layout)
+        if entry[3] >= len(moves):
+            break
+        bit_move = moves[entry[3]]
+
+    return pv
+
+###############################################################################
+#
+# Pondering
+#
+###############################################################################
+
+class Ponderer(object):
+    """
+        Search on the opponent's time. Once our move is chosen, start()
+        predicts their reply and searches our answer to it in a background
+        thread, which fills the transposition table while the game waits for
+        them. take() stops the thread: when they played the predicted reply
+        and the thread searched at least as much as a turn would, its move is
+        played at once, otherwise the turn is searched from the warm table.
+
+        A Ponderer follows a single game at a time.
+
+        Arguments:
+        - table:   the TranspositionTable to fill, by default the shared one
+        - endgame: the EndgameTable to probe, see search_move()
     """
-        We look all the possible moves in the future up to a certain depth and
-        considering that we play perfectly and so does the other player we chose
-        the move that maximize our score defined using _eval_board()
+    def __init__(self, table=None, endgame=None):
+        self.table = table
+        self.endgame = endgame
+        self.thread = None
+        self.event = None
+        self.board = None
+        self.color = None
+        self.result = None
+        self.complete = False
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, board, color):
+        """
+            Predict their reply to our move: the best one found by our search
+            if it is still in the transposition table, the best one of a
+            shallow search otherwise.
+
+            Arguments:
+            - board: the board after our move
+            - color: the color of our AI
+
+            Return value:
+            - move: their predicted move, [] if they cannot play
+        """
+        layout = _layout(len(board))
+        pos = _board_to_bits(board)
+        their_color = "b" if color == "w" else "w"
+        table = transposition_table() if self.table is None else self.table
+        moves = _gen_moves(pos, their_color, True, layout)
+        entry = table.probe(_hash_bits(pos, their_color) ^ \
+            _ZOBRIST_VIEW[color] ^ _ZOBRIST_SIZE[layout.size])
+        if entry is not None and entry[3] < len(moves):
+            return _move_path(moves[entry[3]], layout)
+        return search_move(board, their_color, table=table, \
+            endgame=self.endgame).move
+
+    def _ponder(self, board, color, time_limit, event):
+        """
+            Body of the background thread, see start().
+        """
+        reply = self.predict(board, color)
+        if reply == [] or event.is_set():
+            return
+        board = _update_board_move(board, reply)
+        max_depth = None if time_limit is None else PONDER_DEPTH
+        result = search_move(board, color, None, max_depth, self.table, \
+            endgame=self.endgame, stop=event)
+        self.board = board
+        self.result = result
+        self.complete = not event.is_set()
+
+    def start(self, board, color, time_limit=TIME_LIMIT):
+        """
+            Start pondering, stopping the previous ponder search if any.
+
+            Arguments:
+            - board:      the board after our move
+            - color:      the color of our AI
+            - time_limit: the time budget of our turns, see play(), the ponder
+                          search goes as deep as a turn without budget would
+                          when None, until stopped otherwise
+        """
+        import threading
+        self.stop()
+        self.color = color
+        self.event = threading.Event()
+        self.thread = threading.Thread(target=self._ponder, \
+            args=(board, color, time_limit, self.event))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+            Stop the ponder search and wait for the thread to end.
+        """
+        if self.thread is not None:
+            self.event.set()
+            self.thread.join()
+            self.thread = None
+
+    def take(self, board, color, time_limit=TIME_LIMIT):
+        """
+            Stop pondering and look for a ponder hit.
+
+            Arguments:
+            - board:      the board on which we have to play
+            - color:      the color of our AI
+            - time_limit: the time budget of the turn, see play()
+
+            Return value:
+            - result: the SearchResult of the ponder search if they played the
+                      predicted move and it was searched for the time budget
+                      or to its end, None otherwise
+        """
+        self.stop()
+        result = None
+        if self.board is not None:
+            if self.board == board and self.color == color and \
+                    self.result.depth >= 0 and (self.complete or \
+                    (time_limit is not None and \
+                    self.result.time >= time_limit)):
+                result = self.result
+                self.hits += 1
+            else:
+                self.misses += 1
+        self.board = self.result = None
+        return result
+
+_ponderer = None
+
+def ponderer():
     """
-    # Define the depth of the tree
-    depth = 1 if _number_disc(board) > 6 else 2
+        Return value:
+        - ponderer: the Ponderer used by play(), created on first use
+    """
+    global _ponderer
+    if _ponderer is None:
+        _ponderer = Ponderer()
+    return _ponderer
 
-    # Retrieve the best move
-    best_move, _ = _find_best_move(board, color, depth)
+###############################################################################
 
-    return best_move
\ No newline at end of file
+def play(board, color, time_limit=TIME_LIMIT, workers=1, on_stats=None, \
+        book=None, ponder=None, cache=None):
+    """
+        We look all the possible moves in the future, deeper and deeper while
+        the time budget allows it, and considering that we play perfectly and
+        so does the other player we chose the move that maximize our score
+        defined using _eval_board()
+
+        Arguments:
+        - board:      the content of the board
+        - color:      the color of our AI
+        - time_limit: time budget in seconds, None to search at a fixed depth
+        - workers:    number of processes searching in parallel
+        - on_stats:   function called with the SearchResult and the
+                      SearchStats of the turn, STATS_CALLBACK by default. No
+                      statistics are gathered when both are None. It is not
+                      called for the moves of the opening book.
+        - book:       the OpeningBook to play from, by default the one of
+                      BOOK_PATH if it exists, False to always search
+        - ponder:     whether to search on the opponent's time after the
+                      move, PONDER by default. The successive calls must then
+                      follow a single game, see ponderer(). on_stats is not
+                      called on a ponder hit.
+        - cache:      the AnalysisCache to use, by default the one of
+                      ANALYSIS_PATH if it exists, False to not use any
+
+        Return value:
+        - best_move: list of the squares visited by the played disc
+    """
+    ponder = PONDER if ponder is None else ponder
+    result = ponderer().take(board, color, time_limit) if ponder else None
+
+    book = opening_book() if book is None else book or None
+    if result is None and book is not None:
+        move = book.move(board, color)
+        if move is not None:
+            return move
+
+    if result is None:
+        on_stats = STATS_CALLBACK if on_stats is None else on_stats
+        stats = None if on_stats is None else SearchStats()
+        cache = analysis_cache() if cache is None else cache or None
+        result = search_move(board, color, time_limit, workers=workers, \
+            stats=stats, cache=cache)
+        if on_stats is not None:
+            on_stats(result, stats)
+    if ponder and result.move != []:
+        ponderer().start(_update_board_move(board, result.move), color, \
+            time_limit)
+    return result.move
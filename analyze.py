@@ -0,0 +1,162 @@
+import sys
+import json
+import time
+import argparse
+import threading
+
+import ai
+
+###############################################################################
+#
+# Position analysis service
+#
+# Reads one JSON request per line on stdin and writes one JSON response per
+# line on stdout, as soon as it is known, so that a single warm engine serves
+# many positions. A request is an object with:
+# - board:      the board, as a list of strings
+# - color:      the color to play
+# - id:         any value copied to the response, the line number by default
+# - time_limit: time budget in seconds, ai.TIME_LIMIT by default unless
+#               max_depth is given, null for a fixed depth search
+# - max_depth:  maximum depth, see ai.search_move()
+# - stats:      whether to return the search statistics, false by default
+# The response holds the id and either an error message or the best move, its
+# score, the depth, the number of nodes, the search time and the principal
+# variation, plus the statistics when asked for.
+#
+# With several workers each worker process keeps its own transposition table
+# and caches warm from one request to the next. The responses of concurrent
+# requests may come out of order, the id tells which request they answer.
+#
+###############################################################################
+
+# Maximum number of requests in flight per worker process
+IN_FLIGHT = 2
+
+###############################################################################
+
+def _error(request_id, error):
+    """
+        Response to a request which could not be answered.
+    """
+    return {"id": request_id, "error": "%s: %s" % \
+        (type(error).__name__, error)}
+
+def analyze(request):
+    """
+        Answer a request.
+
+        Arguments:
+        - request: the decoded request, see the top of this file
+
+        Return value:
+        - response: the JSON serializable response
+    """
+    try:
+        board = request["board"]
+        color = request["color"]
+        if color not in ("b", "w"):
+            raise ValueError("Bad color: %r" % (color,))
+        if not isinstance(board, list) or \
+                any(len(row) != len(board) for row in board):
+            raise ValueError("The board must be a list of rows of its size")
+        max_depth = request.get("max_depth")
+        time_limit = request.get("time_limit", \
+            ai.TIME_LIMIT if max_depth is None else None)
+        if time_limit is None and max_depth is None:
+            raise ValueError("Either time_limit or max_depth is needed")
+        stats = ai.SearchStats() if request.get("stats") else None
+        result = ai.search_move(board, color, time_limit, max_depth, \
+            stats=stats, cache=ai.analysis_cache())
+        pv = ai.principal_variation(board, color, result.move, \
+            length=2 * (result.depth + 1))
+    except (KeyError, TypeError, ValueError) as e:
+        return _error(request.get("id"), e)
+
+    response = {"id": request.get("id")}
+    response.update(result._asdict())
+    response["pv"] = [[list(s) for s in m] for m in pv]
+    response["move"] = [list(s) for s in result.move]
+    if stats is not None:
+        response["stats"] = stats.as_dict()
+    return response
+
+###############################################################################
+
+def serve(lines, out, workers=1):
+    """
+        Answer the requests of a stream. A request failing for any reason
+        gets an error response, the service keeps answering the next ones.
+
+        Arguments:
+        - lines:   iterable of the request lines, such as sys.stdin
+        - out:     the file to write the responses to
+        - workers: number of worker processes, 1 to answer in this process
+
+        Return value:
+        - count: number of answered requests
+    """
+    lock = threading.Lock()
+    count = [0]
+
+    def write(response):
+        with lock:
+            out.write(json.dumps(response, sort_keys=True) + "\n")
+            out.flush()
+            count[0] += 1
+
+    pool = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(workers)
+        slots = threading.BoundedSemaphore(workers * IN_FLIGHT)
+
+    def done(future, request_id):
+        slots.release()
+        try:
+            response = future.result()
+        except Exception as e:
+            response = _error(request_id, e)
+        write(response)
+
+    try:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("A request must be a JSON object")
+            except ValueError as e:
+                write(_error(number, e))
+                continue
+            request.setdefault("id", number)
+            if pool is None:
+                try:
+                    response = analyze(request)
+                except Exception as e:
+                    response = _error(request["id"], e)
+                write(response)
+            else:
+                slots.acquire()
+                pool.submit(analyze, request).add_done_callback( \
+                    lambda future, request_id=request["id"]: \
+                    done(future, request_id))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return count[0]
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze positions read as "
+        "JSON lines on stdin.")
+    parser.add_argument("-j", "--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.time()
+    count = serve(sys.stdin, sys.stdout, args.workers)
+    sys.stderr.write("%d requests answered in %.1fs\n" % \
+        (count, time.time() - start))
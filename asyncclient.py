@@ -0,0 +1,351 @@
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit, urlencode
+
+import ai
+import gamerecord
+
+###############################################################################
+#
+# Asynchronous game client
+#
+# Plays many games at once against the game server from a single event loop.
+# The HTTP connections are kept alive and shared by the games, and the AI runs
+# in a process pool so that the loop keeps serving the other games while a
+# move is searched. The transposition table and the caches of the AI are
+# module globals without locks, so the moves must not be searched by threads.
+#
+###############################################################################
+
+# Maximum number of connections per server
+POOL_SIZE = 8
+
+###############################################################################
+
+def _encode(data):
+    """
+        Encode form data the way requests does, a list value giving one field
+        per item.
+    """
+    fields = []
+    for key, values in data.items():
+        if isinstance(values, str) or not hasattr(values, "__iter__"):
+            values = [values]
+        fields.extend((key, v) for v in values if v is not None)
+    return urlencode(fields, doseq=True)
+
+###############################################################################
+
+class HTTPPool(object):
+    """
+        Pool of HTTP/1.1 keep-alive connections. A connection is used by one
+        request at a time and put back in the pool afterwards, unless the
+        server asked to close it. A request failing on a pooled connection
+        before any response is sent again once on a new connection, as the
+        server may have closed the connection while it was idle.
+    """
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.idle = {}
+        self.slots = {}
+        self.opened = 0
+        self.requests = 0
+
+    async def _connect(self, scheme, host, port, reuse=True):
+        """
+            Take an idle connection to the server or open a new one.
+
+            Return value:
+            - reader: the asyncio.StreamReader of the connection
+            - writer: the asyncio.StreamWriter of the connection
+            - pooled: whether the connection was idle in the pool
+        """
+        idle = self.idle.setdefault((scheme, host, port), [])
+        while idle and reuse:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        context = ssl.create_default_context() if scheme == "https" else None
+        self.opened += 1
+        reader, writer = await asyncio.open_connection(host, port, \
+            ssl=context)
+        return reader, writer, False
+
+    async def request(self, method, url, data={}):
+        """
+            Send a request.
+
+            Arguments:
+            - method: "get" or "post"
+            - url:    the URL of the resource
+            - data:   the query parameters or form fields
+
+            Return value:
+            - status: the HTTP status code
+            - body:   the content of the response as bytes
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        server = (parts.scheme, parts.hostname, port)
+        slots = self.slots.get(server)
+        if slots is None:
+            slots = self.slots[server] = asyncio.Semaphore(self.size)
+
+        path = parts.path or "/"
+        body = _encode(data).encode("utf-8")
+        if method == "get":
+            if body:
+                path += "?" + body.decode("utf-8")
+            body = b""
+        elif method != "post":
+            raise Exception("Bad method")
+        if parts.query:
+            path += ("&" if "?" in path else "?") + parts.query
+
+        head = "%s %s HTTP/1.1\r\nHost: %s\r\n" \
+            "Connection: keep-alive\r\nContent-Length: %d\r\n" % \
+            (method.upper(), path, parts.netloc, len(body))
+        if method == "post":
+            head += "Content-Type: application/x-www-form-urlencoded\r\n"
+        request = head.encode("latin-1") + b"\r\n" + body
+
+        async with slots:
+            reuse = True
+            while True:
+                reader, writer, pooled = await self._connect(*server, \
+                    reuse=reuse)
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, headers, content = await _read_response(reader)
+                    break
+                except ConnectionError:
+                    writer.close()
+                    if not pooled:
+                        raise
+                    reuse = False
+                except Exception:
+                    writer.close()
+                    raise
+            self.requests += 1
+            if headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                self.idle[server].append((reader, writer))
+
+        return status, content
+
+    def close(self):
+        """
+            Close the idle connections.
+        """
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle = {}
+
+###############################################################################
+
+async def _read_response(reader):
+    """
+        Read an HTTP response with a Content-Length or chunked body.
+
+        Return value:
+        - status:  the HTTP status code
+        - headers: dict of the headers with lower case names
+        - body:    the content as bytes
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the server")
+    status = int(line.split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, value = line.split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+    return status, headers, body
+
+###############################################################################
+
+async def send_request(pool, url, method, data={}):
+    """
+        Asynchronous version of main.send_request(), raising Exception or
+        main.InvalidMoveException as it does.
+    """
+    status, body = await pool.request(method, url, data)
+    return _content(status, body)
+
+def _content(status, body):
+    """
+        Decode the content of a response of the server.
+
+        Arguments:
+        - status: the HTTP status code
+        - body:   the content of the response as bytes
+
+        Return value:
+        - content: the decoded JSON object
+    """
+    from main import InvalidMoveException
+
+    try:
+        content = json.loads(body.decode("utf-8"))
+    except ValueError:
+        raise Exception("Could not decode response")
+
+    if "error" in content:
+        if status == 200 and content["error"] == "InvalidMove":
+            raise InvalidMoveException()
+        raise Exception(content["error"])
+    if status != 200:
+        raise Exception("Unknown error")
+    return content
+
+###############################################################################
+
+async def play_game(pool, executor, config, size, color, url_prefix=None, \
+        time_limit=ai.TIME_LIMIT, writer=None):
+    """
+        Play a game against the server, the AI moves being searched in the
+        executor.
+
+        Arguments:
+        - pool:       the HTTPPool
+        - executor:   the concurrent.futures.ProcessPoolExecutor running
+                      ai.play(), not a thread pool as the AI is not thread
+                      safe
+        - config:     the player configuration, see main.read_config()
+        - size:       the size of the board
+        - color:      the color of our AI
+        - url_prefix: the URL of the game server, the one of main.py by
+                      default
+        - time_limit: time budget of a move in seconds
+        - writer:     a gamerecord.GameWriter receiving the game once over, if
+                      any, the game starting with our first move
+
+        Return value:
+        - result: dict with the game id, our color, the winner ('b', 'w', ' '
+                  for a draw or None after an invalid move), the number of our
+                  moves and the latency of each of them in seconds
+    """
+    # Imported here as it imports requests, which the processes searching
+    # the moves do not need
+    import main
+
+    url_prefix = main.url_prefix if url_prefix is None else url_prefix
+    loop = asyncio.get_running_loop()
+    data = dict(config, size=size, color=color)
+    game = await send_request(pool, url_prefix + "games", "post", data)
+    board = game["board"]
+    history = []
+    result = {"game": game["id"], "color": color, "winner": None, \
+        "latency": []}
+    while True:
+        start = time.time()
+        move = await loop.run_in_executor(executor, ai.play, board, color, \
+            time_limit)
+        mm = [list(m) for m in move]
+        try:
+            response = await send_request(pool, url_prefix + "games/%d" % \
+                game["id"], "post", {"move": mm})
+        except main.InvalidMoveException:
+            break
+        result["latency"].append(time.time() - start)
+        history.append(mm)
+        if "move" in response:
+            history.append(response["move"])
+        if response["over"]:
+            result["winner"] = response["winner"]
+            break
+        board = response["board"]
+
+    result["moves"] = len(result["latency"])
+    if writer is not None:
+        writer.write(game["board"], color, history, result["winner"])
+    return result
+
+###############################################################################
+
+async def play_games(count, config, executor, size=8, url_prefix=None, \
+        time_limit=ai.TIME_LIMIT, pool_size=POOL_SIZE, writer=None):
+    """
+        Play games concurrently, alternating the color of our AI. A game
+        failing does not stop the other ones.
+
+        Arguments:
+        - count:     number of games
+        - config:    the player configuration, see main.read_config()
+        - executor:  the ProcessPoolExecutor running ai.play()
+        - pool_size: maximum number of connections to the server
+        - see play_game() for the others
+
+        Return value:
+        - results: list of the results of play_game(), in game order, the
+                   result of a failed game being a dict with our color and
+                   the error message
+        - pool:    the HTTPPool used, with its counters
+    """
+    pool = HTTPPool(pool_size)
+    try:
+        results = await asyncio.gather(*[play_game(pool, executor, config, \
+            size, "bw"[i % 2], url_prefix, time_limit, writer) \
+            for i in range(0, count)], return_exceptions=True)
+    finally:
+        pool.close()
+    for i, result in enumerate(results):
+        if isinstance(result, BaseException):
+            results[i] = {"color": "bw"[i % 2], "error": "%s: %s" % \
+                (type(result).__name__, result)}
+    return results, pool
+
+###############################################################################
+
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+
+    parser = argparse.ArgumentParser(description="Play concurrent games.")
+    parser.add_argument("-n", "--games", type=int, default=10)
+    parser.add_argument("-j", "--workers", type=int, default=4,
+        help="processes searching the moves")
+    parser.add_argument("--url",
+        help="URL of the game server, the one of main.py by default")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--time-limit", type=float, default=ai.TIME_LIMIT)
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE)
+    parser.add_argument("--records", help="binary game record file")
+    args = parser.parse_args()
+
+    import main
+    config = main.read_config()
+    records = open(args.records, "wb") if args.records else None
+    writer = gamerecord.GameWriter(records) if records else None
+    with ProcessPoolExecutor(args.workers) as executor:
+        results, pool = asyncio.run(play_games(args.games, config, executor, \
+            args.size, args.url, args.time_limit, args.pool_size, writer))
+    if records is not None:
+        records.close()
+    for result in results:
+        print(json.dumps(result, sort_keys=True))
+    sys.stderr.write("%d requests over %d connections, %d failed games\n" % \
+        (pool.requests, pool.opened, sum("error" in r for r in results)))
@@ -0,0 +1,397 @@
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import ai
+import selfplay
+
+###############################################################################
+#
+# Performance benchmarks
+#
+# Times ai.play() and the primitives it spends its time in on a fixed corpus
+# of positions and writes the results as JSON: the latency percentiles of a
+# call, the calls per second, the searched nodes per second for play() and
+# the peak memory allocated by Python during an untimed run. Given the output
+# of a previous run, the regressions beyond a threshold are reported and make
+# the exit status non zero.
+#
+# play() is called without opening book, pondering nor analysis cache and
+# with cleared transposition table, move cache and capture chain cache, so
+# that every call does the same work. It searches at its fixed default depth
+# unless a time budget is given, in which case the nodes per second are the
+# figure to look at. The caches are also cleared before each call of
+# allowed_moves() and _last_eval_board(), so that they time the move
+# generator rather than cache hits.
+#
+###############################################################################
+
+FORMAT = 2
+
+# name: (category, board, color)
+CORPUS = {
+    "start": ("opening", selfplay.initial_board(8), "b"),
+    "early": ("opening", [
+        "_b_b_b_b",
+        "b___b_b_",
+        "_b_b_b_b",
+        "__b_____",
+        "___w_w__",
+        "w_____w_",
+        "_w_w_w_w",
+        "w_w_w_w_"], "b"),
+    "quiet_middle": ("middlegame", [
+        "_b_b_b_b",
+        "____b_b_",
+        "_____b_w",
+        "________",
+        "_b_b___w",
+        "________",
+        "_______w",
+        "w___w_w_"], "b"),
+    "open_middle": ("middlegame", [
+        "___b___b",
+        "b_b___b_",
+        "________",
+        "w___b_b_",
+        "________",
+        "______w_",
+        "___w___w",
+        "__w_w_w_"], "b"),
+    "king_double_jump": ("tactical", [
+        "_____W_b",
+        "b_b_b___",
+        "_b______",
+        "________",
+        "_w_____b",
+        "w_______",
+        "_w___w_b",
+        "w_____w_"], "w"),
+    "capture_choice": ("tactical", [
+        "_b___b_b",
+        "b___b_b_",
+        "_b_____w",
+        "____b_b_",
+        "_____w__",
+        "w_w_____",
+        "_w___w_w",
+        "w_w_w___"], "b"),
+    "capture_combo": ("tactical", [
+        "________",
+        "b___b___",
+        "_w_w_w__",
+        "________",
+        "_w_w_W__",
+        "________",
+        "_W_w____",
+        "____B___"], "b"),
+    "kings_endgame": ("endgame", [
+        "_B______",
+        "________",
+        "___w_w__",
+        "________",
+        "_b___W__",
+        "________",
+        "___W____",
+        "________"], "b"),
+    "white_king": ("endgame", [
+        "_____W__",
+        "____b_b_",
+        "________",
+        "__B___w_",
+        "________",
+        "__b_____",
+        "________",
+        "________"], "w"),
+    "kings_chase": ("endgame", [
+        "________",
+        "__W_____",
+        "________",
+        "____b___",
+        "_B______",
+        "________",
+        "___w_W__",
+        "________"], "b"),
+}
+
+# Metrics compared with the baseline, True when higher is better
+METRICS = {"p50": False, "p95": False, "p99": False, "nodes_per_second": True,
+    "peak_memory": False}
+
+###############################################################################
+
+def percentile(values, p):
+    """
+        Percentile with linear interpolation between the closest ranks.
+
+        Arguments:
+        - values: non empty list of numbers
+        - p:      the percentile, between 0 and 100
+
+        Return value:
+        - value: the percentile of the values
+    """
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+def _summary(samples, calls, elapsed):
+    """
+        Latency percentiles in seconds and calls per second of samples.
+    """
+    return {
+        "calls": calls,
+        "calls_per_second": calls / elapsed if elapsed > 0 else None,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+    }
+
+def _peak_memory(run):
+    """
+        Peak memory in bytes allocated by Python during a call of run().
+    """
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+###############################################################################
+
+def _reset():
+    """
+        Forget the work of the previous searches.
+    """
+    ai.transposition_table().clear()
+    ai.clear_caches()
+
+def bench_play(positions, repeat=3, time_limit=None):
+    """
+        Time ai.play().
+
+        Arguments:
+        - positions:  list of (board, color)
+        - repeat:     number of calls per position
+        - time_limit: time budget of a call, None for play()'s fixed depth
+
+        Return value:
+        - result: dict of the latency percentiles, calls and nodes per second
+                  and peak memory
+    """
+    searched = [0, 0.0]
+
+    def on_stats(result, stats):
+        searched[0] += result.nodes
+        searched[1] += result.time
+
+    def run(board, color):
+        ai.play(board, color, time_limit, on_stats=on_stats, book=False, \
+            ponder=False, cache=False)
+
+    for board, color in positions:
+        _reset()
+        run(board, color)
+    searched[:] = [0, 0.0]
+
+    samples = []
+    for _ in range(0, repeat):
+        for board, color in positions:
+            _reset()
+            start = time.perf_counter()
+            run(board, color)
+            samples.append(time.perf_counter() - start)
+
+    result = _summary(samples, len(samples), sum(samples))
+    result["nodes_per_second"] = searched[0] / searched[1] \
+        if searched[1] > 0 else None
+    peaks = []
+    for board, color in positions:
+        _reset()
+        peaks.append(_peak_memory(lambda: run(board, color)))
+    result["peak_memory"] = max(peaks)
+    return result
+
+def bench_function(function, calls, repeat=5, number=200, setup=None):
+    """
+        Time a function called on every item of a list, each sample being the
+        mean latency of number consecutive calls so that the timer overhead
+        does not count. Every call is made once before timing.
+
+        Arguments:
+        - function: the function to time
+        - calls:    list of argument tuples
+        - repeat:   number of samples per argument tuple
+        - number:   number of calls per sample
+        - setup:    function called before each call, out of the timings,
+                    None for none. The calls are then timed one by one.
+
+        Return value:
+        - result: dict of the latency percentiles, calls per second and peak
+                  memory
+    """
+    for args in calls:
+        function(*args)
+
+    samples = []
+    elapsed = 0.0
+    for args in calls:
+        for _ in range(0, repeat):
+            if setup is None:
+                start = time.perf_counter()
+                for _ in range(0, number):
+                    function(*args)
+                sample = time.perf_counter() - start
+            else:
+                sample = 0.0
+                for _ in range(0, number):
+                    setup()
+                    start = time.perf_counter()
+                    function(*args)
+                    sample += time.perf_counter() - start
+            elapsed += sample
+            samples.append(sample / number)
+
+    result = _summary(samples, len(calls) * repeat * number, elapsed)
+
+    def run_all():
+        for args in calls:
+            if setup is not None:
+                setup()
+            function(*args)
+
+    result["peak_memory"] = _peak_memory(run_all)
+    return result
+
+###############################################################################
+
+def run(names=None, repeat=3, number=200, time_limit=None):
+    """
+        Run the benchmarks.
+
+        Arguments:
+        - names:      names of the positions of CORPUS, all by default
+        - repeat:     number of samples per position
+        - number:     number of calls per sample of the primitives
+        - time_limit: time budget of play(), see bench_play()
+
+        Return value:
+        - report: the JSON serializable report
+    """
+    names = sorted(CORPUS) if names is None else names
+    positions = [CORPUS[name][1:] for name in names]
+    other = {"b": "w", "w": "b"}
+    start = time.time()
+
+    benchmarks = {
+        "play": bench_play(positions, repeat, time_limit),
+        "allowed_moves": bench_function(ai.allowed_moves, positions, \
+            repeat, number, ai.clear_caches),
+        "_eval_board": bench_function(ai._eval_board, positions, repeat, \
+            number),
+        "_last_eval_board": bench_function(ai._last_eval_board, \
+            [(board, other[color], color) for board, color in positions], \
+            repeat, number, ai.clear_caches),
+    }
+
+    return {
+        "format": FORMAT,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "positions": names,
+        "repeat": repeat,
+        "number": number,
+        "time_limit": time_limit,
+        "time": time.time() - start,
+        "benchmarks": benchmarks,
+    }
+
+###############################################################################
+
+def compare(report, baseline, threshold=0.2):
+    """
+        Compare a report with a baseline report.
+
+        Arguments:
+        - report:    the report of run()
+        - baseline:  the report of a previous run
+        - threshold: relative slowdown beyond which a metric is a regression,
+                     the timings of two runs on an idle machine easily
+                     differ by 10%
+
+        Return value:
+        - changes: list of (benchmark, metric, baseline value, value, relative
+                   change, regression boolean) for the metrics found in both
+                   reports, a positive change being an improvement
+    """
+    changes = []
+    for name in sorted(report["benchmarks"]):
+        old = baseline.get("benchmarks", {}).get(name)
+        if old is None:
+            continue
+        new = report["benchmarks"][name]
+        for metric, higher_is_better in sorted(METRICS.items()):
+            if not new.get(metric) or not old.get(metric):
+                continue
+            change = new[metric] / old[metric] - 1
+            if not higher_is_better:
+                change = old[metric] / new[metric] - 1
+            changes.append((name, metric, old[metric], new[metric], change, \
+                change < -threshold))
+    return changes
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the AI.")
+    parser.add_argument("positions", nargs="*",
+        help="names of the positions, all by default: %s" % \
+        ", ".join(sorted(CORPUS)))
+    parser.add_argument("-o", "--output", default="-",
+        help="JSON output file, - for stdout")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+        help="samples per position")
+    parser.add_argument("-n", "--number", type=int, default=200,
+        help="calls per sample of the primitives")
+    parser.add_argument("--time-limit", type=float, default=None,
+        help="time budget of play(), its fixed depth by default")
+    parser.add_argument("-c", "--compare",
+        help="report of a previous run to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+        help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+    for name in args.positions:
+        if name not in CORPUS:
+            parser.error("unknown position %s" % name)
+
+    report = run(args.positions or None, args.repeat, args.number, \
+        args.time_limit)
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == "-":
+        print(data)
+    else:
+        with open(args.output, "w") as f:
+            f.write(data + "\n")
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        for key in ("format", "positions", "repeat", "number", "time_limit"):
+            if baseline.get(key) != report[key]:
+                sys.stderr.write("Warning: the baseline was run with a " \
+                    "different %s\n" % key)
+        for name, metric, old, new, change, regression in \
+                compare(report, baseline, args.threshold):
+            regressions += regression
+            sys.stderr.write("%-18s %-16s %12.6g %12.6g %+7.1f%%%s\n" % \
+                (name, metric, old, new, 100 * change, \
+                "  REGRESSION" if regression else ""))
+        sys.stderr.write("%d regressions\n" % regressions)
+    sys.exit(1 if regressions else 0)
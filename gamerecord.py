@@ -0,0 +1,253 @@
+import sys
+import json
+import struct
+import argparse
+from collections import namedtuple
+
+import ai
+import openingbook
+
+###############################################################################
+#
+# Binary game records
+#
+# A record file starts with an 8 bytes header, the magic followed by the
+# format version, and holds the games one after the other, each one being:
+# - its length in bytes, not counting this field (I)
+# - the board size, the color of the first player and the winner (3 B)
+# - the number of moves (H)
+# - the dark squares of the starting board in row major order, two per byte
+#   (see _SQUARE_CODES), the light ones being empty
+# - the moves as their index in the move generation order of their position,
+#   one byte each, or _LONG_INDEX followed by the index (H) for the rare
+#   positions with more moves. A move the move generator does not know, such as
+#   the ones of servers not enforcing captures, is written as _EXPLICIT, its
+#   number of squares and the squares as row * size + column (B each).
+# All the numbers are little-endian. An 8x8 game of 60 plies takes 85 bytes.
+#
+###############################################################################
+
+MAGIC = b"CKGR"
+VERSION = 1
+HEADER = 8
+
+_SQUARE_CODES = {"_": 0, "b": 1, "B": 2, "w": 3, "W": 4}
+_SQUARES = "_bBwW"
+_WINNER_CODES = {"b": 0, "w": 1, " ": 2, None: 3}
+_WINNERS = "bw "
+_COLORS = "bw"
+_EXPLICIT = 254
+_LONG_INDEX = 255
+
+# A game, the same tuple as the games of openingbook.read_log()
+GameRecord = namedtuple("GameRecord", "board color moves winner")
+
+###############################################################################
+
+def _dark_squares(size):
+    """
+        Coordinates of the dark squares of a board in row major order.
+    """
+    return [(r, c) for r in range(0, size) for c in range(0, size) \
+        if (r + c) % 2 == 1]
+
+def encode(board, color, moves, winner):
+    """
+        Encode a game.
+
+        Arguments:
+        - board:  the starting board
+        - color:  the color of the first player
+        - moves:  the moves played, as lists of squares
+        - winner: 'b', 'w', ' ' for a draw or None if unknown
+
+        Return value:
+        - data: the record without its length
+
+        Raise ValueError if a disc of the starting board is on a light
+        square, which the record cannot hold.
+    """
+    size = len(board)
+    layout = ai._layout(size)
+    for r in range(0, size):
+        for c in range(r % 2, size, 2):
+            if board[r][c] != "_":
+                raise ValueError("Disc on the light square %s" % ((r, c),))
+    codes = [_SQUARE_CODES[board[r][c]] for r, c in _dark_squares(size)]
+    if len(codes) % 2:
+        codes.append(0)
+    data = bytearray(struct.pack("<BBBH", size, _COLORS.index(color), \
+        _WINNER_CODES[winner], len(moves)))
+    data.extend(codes[i] | codes[i + 1] << 4 for i in range(0, len(codes), 2))
+
+    pos = ai._board_to_bits(board)
+    for move in moves:
+        move = [tuple(m) for m in move]
+        generated = ai._gen_moves(pos, color, True, layout)
+        paths = [ai._move_path(m, layout) for m in generated]
+        if move in paths:
+            index = paths.index(move)
+            if index < _EXPLICIT:
+                data.append(index)
+            else:
+                data.extend(struct.pack("<BH", _LONG_INDEX, index))
+            pos = ai._apply_move(pos, color, generated[index])
+        else:
+            data.extend([_EXPLICIT, len(move)])
+            data.extend(r * size + c for r, c in move)
+            pos = ai._board_to_bits(ai._update_board_move( \
+                ai._bits_to_board(pos, layout), move))
+        color = "w" if color == "b" else "b"
+    return bytes(data)
+
+def decode(data):
+    """
+        Decode a game encoded by encode().
+
+        Return value:
+        - game: the GameRecord
+    """
+    size, color, winner, count = struct.unpack_from("<BBBH", data)
+    layout = ai._layout(size)
+    offset = 5
+    board = [["_"] * size for _ in range(0, size)]
+    for i, (r, c) in enumerate(_dark_squares(size)):
+        board[r][c] = _SQUARES[data[offset + i // 2] >> 4 * (i % 2) & 15]
+    offset += (size * size // 2 + 1) // 2
+    board = ["".join(row) for row in board]
+    color = _COLORS[color]
+
+    moves = []
+    pos = ai._board_to_bits(board)
+    turn = color
+    for _ in range(0, count):
+        index = data[offset]
+        offset += 1
+        if index == _EXPLICIT:
+            n = data[offset]
+            move = [divmod(x, size) for x in data[offset + 1:offset + 1 + n]]
+            offset += 1 + n
+            moves.append(move)
+            pos = ai._board_to_bits(ai._update_board_move( \
+                ai._bits_to_board(pos, layout), move))
+        else:
+            if index == _LONG_INDEX:
+                index, = struct.unpack_from("<H", data, offset)
+                offset += 2
+            move = ai._gen_moves(pos, turn, True, layout)[index]
+            moves.append(ai._move_path(move, layout))
+            pos = ai._apply_move(pos, turn, move)
+        turn = "w" if turn == "b" else "b"
+
+    winner = _WINNERS[winner] if winner < len(_WINNERS) else None
+    return GameRecord(board, color, moves, winner)
+
+###############################################################################
+
+class GameWriter(object):
+    """
+        Streaming writer of a record file: each game is written as soon as it
+        is given.
+
+        Arguments:
+        - f: the file open in binary mode, positioned at its start
+    """
+    def __init__(self, f):
+        self.f = f
+        self.games = 0
+        f.write(MAGIC + struct.pack("<B", VERSION) + \
+            bytes(HEADER - len(MAGIC) - 1))
+
+    def write(self, board, color, moves, winner):
+        """
+            Append a game, see encode().
+        """
+        data = encode(board, color, moves, winner)
+        self.f.write(struct.pack("<I", len(data)) + data)
+        self.games += 1
+
+###############################################################################
+
+def read(f):
+    """
+        Read the games of a record file one at a time.
+
+        Arguments:
+        - f: the file open in binary mode
+
+        Return value:
+        - games: iterator of GameRecord
+    """
+    header = f.read(HEADER)
+    if header[:len(MAGIC)] != MAGIC or header[len(MAGIC)] != VERSION:
+        raise ValueError("Not a game record file")
+    while True:
+        length = f.read(4)
+        if not length:
+            break
+        data = f.read(struct.unpack("<I", length)[0])
+        yield decode(data)
+
+def boards(game):
+    """
+        Replay a game.
+
+        Arguments:
+        - game: the GameRecord
+
+        Return value:
+        - boards: iterator of (board, color) from the starting board to the
+                  final one, color being the next player
+    """
+    board, color = game.board, game.color
+    yield board, color
+    for move in game.moves:
+        board = ai._update_board_move(board, move)
+        color = "w" if color == "b" else "b"
+        yield board, color
+
+###############################################################################
+
+def convert(paths, out):
+    """
+        Convert text logs of main.py and JSONL outputs of selfplay.py.
+
+        Arguments:
+        - paths: the files to convert, the ones ending with .jsonl being read
+                 as self-play outputs
+        - out:   the binary file to write the records to
+
+        Return value:
+        - count: number of games written
+    """
+    writer = GameWriter(out)
+    for path in paths:
+        if path.endswith(".jsonl"):
+            games = openingbook.read_selfplay(path)
+        else:
+            games = openingbook.read_log(path)
+        for board, color, moves, winner in games:
+            writer.write(board, color, moves, winner)
+    return writer.games
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert or list games.")
+    parser.add_argument("inputs", nargs="+",
+        help="text logs of main.py or JSONL outputs of selfplay.py, or record "
+        "files to list with --list")
+    parser.add_argument("-o", "--output", default="games.rec")
+    parser.add_argument("-l", "--list", action="store_true",
+        help="print the games of record files as JSON lines")
+    args = parser.parse_args()
+
+    if args.list:
+        for path in args.inputs:
+            with open(path, "rb") as f:
+                for game in read(f):
+                    print(json.dumps(game._asdict(), sort_keys=True))
+    else:
+        with open(args.output, "wb") as out:
+            count = convert(args.inputs, out)
+        sys.stderr.write("%d games written to %s\n" % (count, args.output))
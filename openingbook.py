@@ -0,0 +1,185 @@
+import sys
+import json
+import argparse
+from array import array
+
+import ai
+
+###############################################################################
+#
+# Opening book builder
+#
+# Reads the games printed by main.py and the records of selfplay.py, and
+# weights the moves of their first plies by the result of the game for the
+# player who made them: 2 for a win, 1 for a draw, 0 for a loss. Moves which
+# never led to a win or a draw are left out.
+#
+###############################################################################
+
+# Number of plies of each game entering the book
+PLIES = 16
+
+_RESULT_WEIGHT = {"win": 2, "draw": 1, "loss": 0}
+
+###############################################################################
+
+def _parse_move(text):
+    """
+        Parse a move printed by main.print_move(), "(2, 1), (3, 0)".
+    """
+    return [tuple(int(x) for x in square.strip(" ()").split(",")) \
+        for square in text.strip().split("),")]
+
+def _parse_board(lines):
+    """
+        Parse a board printed by main.print_board(), without its top border.
+    """
+    board = []
+    for i, line in enumerate(lines):
+        row = ""
+        for j in range(0, len(lines)):
+            c = line[2 + 2 * j]
+            row += "_" if (i + j) % 2 == 0 or c == " " else c
+        board.append(row)
+    return board
+
+###############################################################################
+
+def read_log(path):
+    """
+        Read the games of a main.py output such as output_game.txt.
+
+        Arguments:
+        - path: the log file
+
+        Return value:
+        - games: list of (board, color, moves, winner) with the starting
+                 board, the color of the first player, the moves as lists of
+                 squares and the winner, 'b', 'w' or ' ' for a draw. Games
+                 without result are left out.
+    """
+    games = []
+    with open(path, "r") as f:
+        lines = f.read().splitlines()
+
+    game = None
+    for i, line in enumerate(lines):
+        if line in ("You start to play !", "Deepomatic starts to play !"):
+            ours = "b" if line.startswith("You") else "w"
+            size = len(lines[i + 1].strip()) // 2 - 1
+            board = _parse_board(lines[i + 2:i + 2 + size])
+            game = {"board": board, "ours": ours, "moves": []}
+        elif game is None:
+            continue
+        elif line.startswith("Your move:") or \
+                line.startswith("Deepomatic made this move:"):
+            game["moves"].append(_parse_move(line.split(":", 1)[1]))
+        elif line.startswith("Game over:"):
+            theirs = "w" if game["ours"] == "b" else "b"
+            if "draw" in line:
+                winner = " "
+            elif "you win" in line:
+                winner = game["ours"]
+            else:
+                winner = theirs
+            games.append((game["board"], game["ours"], game["moves"], \
+                winner))
+            game = None
+
+    return games
+
+def read_selfplay(path):
+    """
+        Read the games of a selfplay.py output, see read_log().
+    """
+    games = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            moves = [[tuple(s) for s in m] for m in record["history"]]
+            games.append((record["opening"], record["first"], moves, \
+                record["winner"]))
+    return games
+
+###############################################################################
+
+def build(games, plies=PLIES):
+    """
+        Weight the moves of the first plies of each game.
+
+        Arguments:
+        - games: list of (board, color, moves, winner), see read_log()
+        - plies: number of plies of each game entering the book
+
+        Return value:
+        - entries: dict of weight by (Zobrist hash, move index), see
+                   ai.OpeningBook
+    """
+    entries = {}
+    for board, color, moves, winner in games:
+        for move in moves[:plies]:
+            layout = ai._layout(len(board))
+            pos = ai._board_to_bits(board)
+            paths = [ai._move_path(m, layout) \
+                for m in ai._gen_moves(pos, color, True, layout)]
+            if move not in paths:
+                break
+            if winner == " ":
+                weight = _RESULT_WEIGHT["draw"]
+            else:
+                weight = _RESULT_WEIGHT["win" if winner == color else "loss"]
+            key = (ai.OpeningBook.key(pos, color, layout), paths.index(move))
+            entries[key] = entries.get(key, 0) + weight
+
+            board = ai._update_board_move(board, move)
+            color = "w" if color == "b" else "b"
+
+    return dict((k, w) for k, w in entries.items() if w > 0)
+
+###############################################################################
+
+def write(path, entries):
+    """
+        Write an opening book in the format read by ai.OpeningBook.
+
+        Arguments:
+        - path:    the file to write
+        - entries: dict of weight by (Zobrist hash, move index)
+    """
+    entries = sorted(entries.items())
+    count = array("I", [len(entries)])
+    keys = array(ai._HASH_TYPECODE, [k for (k, _), _ in entries])
+    moves = array("B", [m for (_, m), _ in entries])
+    weights = array("H", [min(w, 65535) for _, w in entries])
+    if sys.byteorder != "little":
+        for values in (count, keys, moves, weights):
+            values.byteswap()
+    with open(path, "wb") as f:
+        f.write(ai._BOOK_MAGIC)
+        for values in (count, keys, moves, weights):
+            dump = getattr(values, "tobytes", None) or values.tostring
+            f.write(dump())
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book.")
+    parser.add_argument("logs", nargs="*", default=[],
+        help="outputs of main.py such as output_game.txt")
+    parser.add_argument("-s", "--selfplay", nargs="*", default=[],
+        help="JSONL outputs of selfplay.py")
+    parser.add_argument("-p", "--plies", type=int, default=PLIES)
+    parser.add_argument("-o", "--output", default=ai.BOOK_PATH)
+    args = parser.parse_args()
+
+    games = []
+    for path in args.logs:
+        games.extend(read_log(path))
+    for path in args.selfplay:
+        games.extend(read_selfplay(path))
+    entries = build(games, args.plies)
+    write(args.output, entries)
+    sys.stderr.write("%d games, %d book moves written to %s\n" % \
+        (len(games), len(entries), args.output))
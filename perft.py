@@ -0,0 +1,199 @@
+import sys
+import time
+import argparse
+
+import ai
+import selfplay
+
+###############################################################################
+#
+# Perft: count the leaves of the game tree to a fixed depth
+#
+# The counts of the curated positions below were computed with the original
+# string based move generator and are checked by test.py. Any change in the
+# move generator that alters a count is a rule bug.
+#
+###############################################################################
+
+# name: (board, color, leaf counts at depth 1, 2, ...)
+POSITIONS = {
+    "start": (selfplay.initial_board(8), "b",
+        [7, 49, 302, 1469, 7361, 36768, 179740]),
+    "capture_combo": ([
+        "________",
+        "b___b___",
+        "_w_w_w__",
+        "________",
+        "_w_w_W__",
+        "________",
+        "_W_w____",
+        "____B___"], "b", [15, 47, 218, 1339, 6010]),
+    "king_in_middle": ([
+        "________",
+        "____b_b_",
+        "___w____",
+        "________",
+        "________",
+        "________",
+        "________",
+        "________"], "w", [1, 0]),
+    "white_king": ([
+        "_____W__",
+        "____b_b_",
+        "________",
+        "__B___w_",
+        "________",
+        "__b_____",
+        "________",
+        "________"], "w", [2, 10, 21, 73, 344]),
+    "kings_endgame": ([
+        "_B______",
+        "________",
+        "___w_w__",
+        "________",
+        "_b___W__",
+        "________",
+        "___W____",
+        "________"], "b", [4, 26, 83, 677, 2346]),
+}
+
+###############################################################################
+
+def perft(board, color, depth):
+    """
+        Count the leaves of the game tree with the public string interface.
+
+        Arguments:
+        - board: the board as a list of strings
+        - color: the color of the next player
+        - depth: number of moves to play
+
+        Return value:
+        - count: number of move sequences of the given length
+    """
+    if depth == 0:
+        return 1
+    moves = ai.allowed_moves(board, color)
+    if depth == 1:
+        return len(moves)
+    next_color = "w" if color == "b" else "b"
+    return sum(perft(ai._update_board_move(board, move), next_color, depth - 1) \
+        for move in moves)
+
+###############################################################################
+
+def perft_bits(pos, color, depth):
+    """
+        Same as perft() with the bitboard move generator.
+
+        Arguments:
+        - pos:   the (black, white, kings) masks
+        - color: the color of the next player
+        - depth: number of moves to play
+
+        Return value:
+        - count: number of move sequences of the given length
+    """
+    if depth == 0:
+        return 1
+    moves = ai._gen_moves(pos, color)
+    if depth == 1:
+        return len(moves)
+    next_color = "w" if color == "b" else "b"
+    return sum(perft_bits(ai._apply_move(pos, color, move), next_color, \
+        depth - 1) for move in moves)
+
+###############################################################################
+
+def _run(name, depth, bits):
+    """
+        Time one perft count.
+
+        Return value:
+        - nodes: number of leaves
+        - rate:  leaves per second
+    """
+    board, color = POSITIONS[name][0], POSITIONS[name][1]
+    ai.clear_caches()
+    start = time.time()
+    if bits:
+        nodes = perft_bits(ai._board_to_bits(board), color, depth)
+    else:
+        nodes = perft(board, color, depth)
+    elapsed = time.time() - start
+    return nodes, nodes / elapsed if elapsed > 0 else float("inf")
+
+###############################################################################
+
+def primitives(name, depth, repeat=3):
+    """
+        Time the string primitives on every inner node of a perft tree.
+
+        Arguments:
+        - name:   name of the position
+        - depth:  depth of the tree
+        - repeat: number of timed runs, the best one is kept
+
+        Return value:
+        - rates: calls per second of allowed_moves() and _update_board_move()
+    """
+    board, color = POSITIONS[name][0], POSITIONS[name][1]
+    nodes = [(board, color)]
+    level = nodes
+    for _ in range(1, depth):
+        next_level = []
+        for b, c in level:
+            n = "w" if c == "b" else "b"
+            next_level.extend((ai._update_board_move(b, m), n) \
+                for m in ai.allowed_moves(b, c))
+        nodes.extend(next_level)
+        level = next_level
+    moves = [(b, m) for b, c in nodes for m in ai.allowed_moves(b, c)]
+
+    best_gen = best_upd = float("inf")
+    for _ in range(0, repeat):
+        ai.clear_caches()
+        start = time.time()
+        for b, c in nodes:
+            ai.allowed_moves(b, c)
+        best_gen = min(best_gen, time.time() - start)
+        start = time.time()
+        for b, m in moves:
+            ai._update_board_move(b, m)
+        best_upd = min(best_upd, time.time() - start)
+    return len(nodes) / max(best_gen, 1e-9), len(moves) / max(best_upd, 1e-9)
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count and time perft.")
+    parser.add_argument("positions", nargs="*", default=sorted(POSITIONS),
+        help="names of the positions, all by default")
+    parser.add_argument("-d", "--depth", type=int, default=None,
+        help="maximum depth, the deepest reference count by default")
+    parser.add_argument("--bits", action="store_true",
+        help="use the bitboard interface instead of the string one")
+    parser.add_argument("--primitives", action="store_true",
+        help="also time allowed_moves and _update_board_move separately")
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.positions:
+        counts = POSITIONS[name][2]
+        depth = args.depth or len(counts)
+        for d in range(1, depth + 1):
+            nodes, rate = _run(name, d, args.bits)
+            if d <= len(counts) and nodes != counts[d - 1]:
+                status = "FAILED (expected %d)" % counts[d - 1]
+                failed = True
+            elif d <= len(counts):
+                status = "OK"
+            else:
+                status = "-"
+            print("%-16s depth %2d %12d nodes %12.0f nodes/s  %s" % \
+                (name, d, nodes, rate, status))
+        if args.primitives:
+            gen, upd = primitives(name, depth)
+            print("%-16s allowed_moves %12.0f calls/s, " \
+                "_update_board_move %12.0f calls/s" % (name, gen, upd))
+    sys.exit(1 if failed else 0)
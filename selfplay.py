@@ -0,0 +1,281 @@
+import sys
+import json
+import time
+import random
+import argparse
+
+import ai
+import gamerecord
+
+###############################################################################
+#
+# Local self-play runner
+#
+# Plays games between two local players, the AI or a random mover, without
+# any network access. Games are spread over a pool of worker processes and
+# one JSON record per game is streamed to the output as soon as it is known.
+#
+###############################################################################
+
+PLAYERS = ("ai", "random")
+
+# Number of plies after which a game is declared a draw
+MAX_MOVES = 200
+
+###############################################################################
+
+def initial_board(size=8):
+    """
+        Build the starting position.
+
+        Arguments:
+        - size: the size of the board
+
+        Return value:
+        - board: list of strings, black at the top, white at the bottom
+    """
+    rows = size // 2 - 1
+    board = []
+    for i in range(0, size):
+        if i < rows:
+            disc = "b"
+        elif i >= size - rows:
+            disc = "w"
+        else:
+            disc = "_"
+        board.append("".join(disc if (i + j) % 2 == 1 else "_" \
+            for j in range(0, size)))
+    return board
+
+###############################################################################
+
+def random_opening(rng, plies, size=8):
+    """
+        Play random moves from the starting position.
+
+        Arguments:
+        - rng:   the random.Random generator to draw the moves from
+        - plies: number of random moves to play
+        - size:  the size of the board
+
+        Return value:
+        - board: the resulting board, the game may already be over
+        - color: the color of the next player
+    """
+    board = initial_board(size)
+    color = "b"
+    for _ in range(0, plies):
+        moves = ai.allowed_moves(board, color)
+        if moves == []:
+            break
+        board = ai._update_board_move(board, rng.choice(moves))
+        color = "w" if color == "b" else "b"
+    return board, color
+
+###############################################################################
+
+def play_game(board, color, players, time_limit=None, max_depth=2, \
+        max_moves=MAX_MOVES, seed=0):
+    """
+        Play a game until one player cannot move or max_moves plies are played.
+
+        Arguments:
+        - board:      the opening board
+        - color:      the color of the first player
+        - players:    dict giving the player of each color, "ai" or "random"
+        - time_limit: time budget of an AI move in seconds, None for no limit
+        - max_depth:  maximum depth of an AI move, None for the default of
+                      ai.search_move()
+        - max_moves:  number of plies after which the game is a draw
+        - seed:       seed of the random player
+
+        Return value:
+        - record: dict with the winner ('b', 'w' or ' ' for a draw), the
+                  number of plies, and the squares visited, the latency in
+                  seconds and the number of searched nodes of every move
+    """
+    rng = random.Random(seed)
+    record = {"players": players, "first": color, "opening": board}
+    history = []
+    latency = []
+    nodes = []
+    winner = " "
+    while len(latency) < max_moves:
+        start = time.time()
+        if players[color] == "ai":
+            result = ai.search_move(board, color, time_limit, max_depth)
+            move = result.move
+            nodes.append(result.nodes)
+        else:
+            moves = ai.allowed_moves(board, color)
+            move = rng.choice(moves) if moves != [] else []
+            nodes.append(0)
+        latency.append(time.time() - start)
+        if move == []:
+            latency.pop()
+            nodes.pop()
+            winner = "w" if color == "b" else "b"
+            break
+        history.append(move)
+        board = ai._update_board_move(board, move)
+        color = "w" if color == "b" else "b"
+
+    record["winner"] = winner
+    record["moves"] = len(latency)
+    record["history"] = history
+    record["latency"] = latency
+    record["nodes"] = nodes
+    return record
+
+###############################################################################
+
+def _play_task(task):
+    """
+        Worker entry point, unpacks a task built by games().
+    """
+    index, board, color, players, kwargs = task
+    record = play_game(board, color, players, **kwargs)
+    record["game"] = index
+    return record
+
+###############################################################################
+
+def games(count, players, openings=None, opening_plies=0, seed=0, \
+        size=8, **kwargs):
+    """
+        Build the tasks of a self-play run. Each opening is played twice with
+        the players swapping colors, so that a biased opening favours both
+        sides equally.
+
+        Arguments:
+        - count:         number of games
+        - players:       tuple of the two players, "ai" or "random"
+        - openings:      list of (board, color) to start from, by default the
+                         starting position followed by opening_plies random
+                         moves
+        - opening_plies: number of random moves of the generated openings
+        - seed:          seed of the generated openings and random players
+        - size:          the size of the board of the generated openings
+        - kwargs:        arguments passed to play_game()
+
+        Return value:
+        - tasks: list of tasks for _play_task()
+    """
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(0, count):
+        if i % 2 == 0:
+            if openings:
+                board, color = openings[(i // 2) % len(openings)]
+            else:
+                board, color = random_opening(rng, opening_plies, size)
+            sides = {"b": players[0], "w": players[1]}
+        else:
+            sides = {"b": players[1], "w": players[0]}
+        task_kwargs = dict(kwargs, seed=seed + i)
+        tasks.append((i, board, color, sides, task_kwargs))
+    return tasks
+
+###############################################################################
+
+def run(tasks, out, workers=1, writer=None):
+    """
+        Play the games and write one JSON line per game, in game order.
+
+        Arguments:
+        - tasks:   list of tasks built by games()
+        - out:     the file to write the records to
+        - workers: number of worker processes, 1 to play in this process
+        - writer:  a gamerecord.GameWriter also receiving the games, if any
+
+        Return value:
+        - summary: dict with the number of wins of each player, of draws and
+                   the total number of plies and nodes
+    """
+    summary = {"draw": 0, "plies": 0, "nodes": 0, "time": 0.0}
+    start = time.time()
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(workers)
+        records = pool.map(_play_task, tasks, chunksize=1)
+    else:
+        pool = None
+        records = map(_play_task, tasks)
+
+    try:
+        for record in records:
+            out.write(json.dumps(record, sort_keys=True) + "\n")
+            out.flush()
+            if writer is not None:
+                writer.write(record["opening"], record["first"], \
+                    record["history"], record["winner"])
+            if record["winner"] == " ":
+                summary["draw"] += 1
+            else:
+                player = record["players"][record["winner"]]
+                summary[player] = summary.get(player, 0) + 1
+            summary["plies"] += record["moves"]
+            summary["nodes"] += sum(record["nodes"])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    summary["time"] = time.time() - start
+    return summary
+
+###############################################################################
+
+def _read_openings(path):
+    """
+        Read openings from a JSONL file, one {"board": [...], "color": "b"}
+        object per line.
+    """
+    openings = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                opening = json.loads(line)
+                openings.append((opening["board"], opening.get("color", "b")))
+    return openings
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play local games.")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-j", "--workers", type=int, default=1)
+    parser.add_argument("-o", "--output", default="-",
+        help="JSONL output file, - for stdout")
+    parser.add_argument("--players", nargs=2, choices=PLAYERS,
+        default=["ai", "random"])
+    parser.add_argument("--openings", help="JSONL file of opening positions")
+    parser.add_argument("--opening-plies", type=int, default=4,
+        help="random moves of the generated openings")
+    parser.add_argument("--size", type=int, default=8,
+        help="size of the board of the generated openings")
+    parser.add_argument("--depth", type=int, default=2,
+        help="maximum depth of the AI, 0 for ai.MAX_DEPTH with --time-limit "
+        "and for the default depth of ai.search_move() without")
+    parser.add_argument("--time-limit", type=float, default=None,
+        help="time budget of an AI move in seconds")
+    parser.add_argument("--max-moves", type=int, default=MAX_MOVES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--records",
+        help="binary game record file also receiving the games")
+    args = parser.parse_args()
+
+    openings = _read_openings(args.openings) if args.openings else None
+    tasks = games(args.games, args.players, openings, args.opening_plies, \
+        args.seed, args.size, time_limit=args.time_limit, \
+        max_depth=args.depth or None, max_moves=args.max_moves)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    records = open(args.records, "wb") if args.records else None
+    try:
+        writer = gamerecord.GameWriter(records) if records else None
+        summary = run(tasks, out, args.workers, writer)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if records is not None:
+            records.close()
+    sys.stderr.write("%s\n" % json.dumps(summary, sort_keys=True))
@@ -0,0 +1,280 @@
+import sys
+import json
+import random
+import asyncio
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+import ai
+import selfplay
+
+###############################################################################
+#
+# Local stub of the game server
+#
+# Serves the two endpoints used by main.py and asyncclient.py on keep-alive
+# HTTP/1.1 connections: POST <prefix>games creates a game and POST
+# <prefix>games/<id> plays a move and answers with the reply of the server,
+# a random mover or the AI at a small fixed depth.
+#
+###############################################################################
+
+PREFIX = "/checkers/"
+
+OPPONENTS = ("random", "ai")
+
+###############################################################################
+
+class StubServer(object):
+    """
+        State of the games of the stub server.
+
+        Arguments:
+        - opponent:  "random" or "ai"
+        - max_moves: number of plies after which a game is a draw
+        - seed:      seed of the random mover
+    """
+    def __init__(self, opponent="random", max_moves=selfplay.MAX_MOVES, \
+            seed=0):
+        self.opponent = opponent
+        self.max_moves = max_moves
+        self.rng = random.Random(seed)
+        self.games = {}
+        self.connections = 0
+        self.requests = 0
+
+    def _reply(self, game):
+        """
+            Play the move of the server, if the game is not over.
+
+            Return value:
+            - move: the move played, None if the server cannot move
+        """
+        board, color = game["board"], game["server"]
+        if self.opponent == "ai":
+            move = ai.search_move(board, color, None, 1).move
+        else:
+            moves = ai.allowed_moves(board, color)
+            move = self.rng.choice(moves) if moves != [] else []
+        if move == []:
+            return None
+        game["board"] = ai._update_board_move(board, move)
+        game["plies"] += 1
+        return move
+
+    def new_game(self, fields):
+        """
+            Handle POST <prefix>games.
+        """
+        size = int(fields.get("size", ["8"])[0])
+        color = fields.get("color", ["b"])[0]
+        if color not in ("b", "w") or \
+                size not in range(4, ai._MAX_SIZE + 1, 2):
+            return 400, {"error": "BadRequest"}
+        game = {
+            "id": len(self.games) + 1,
+            "board": selfplay.initial_board(size),
+            "candidate": color,
+            "server": "w" if color == "b" else "b",
+            "plies": 0,
+            "over": False,
+        }
+        self.games[game["id"]] = game
+        if color == "w":
+            self._reply(game)
+        return 200, {"id": game["id"], "board": game["board"], \
+            "size": size, "color": color}
+
+    def new_move(self, game_id, fields):
+        """
+            Handle POST <prefix>games/<id>.
+        """
+        game = self.games.get(game_id)
+        if game is None:
+            return 404, {"error": "UnknownGame"}
+        if game["over"]:
+            return 400, {"error": "GameOver"}
+        coords = [int(x) for x in fields.get("move", [])]
+        move = [tuple(coords[i:i + 2]) for i in range(0, len(coords), 2)]
+        if move not in ai.allowed_moves(game["board"], game["candidate"]):
+            return 200, {"error": "InvalidMove"}
+
+        game["board"] = ai._update_board_move(game["board"], move)
+        game["plies"] += 1
+        response = {"board_after_candidate_move": game["board"]}
+        if ai.allowed_moves(game["board"], game["server"]) == []:
+            game["over"], winner = True, game["candidate"]
+        else:
+            response["move"] = [list(m) for m in self._reply(game)]
+            if ai.allowed_moves(game["board"], game["candidate"]) == []:
+                game["over"], winner = True, game["server"]
+            elif game["plies"] >= self.max_moves:
+                game["over"], winner = True, " "
+        response["board"] = game["board"]
+        response["over"] = game["over"]
+        if game["over"]:
+            response["winner"] = winner
+        return 200, response
+
+    def route(self, method, path, body):
+        """
+            Dispatch a request.
+
+            Return value:
+            - status:  the HTTP status code
+            - content: the JSON object to answer
+        """
+        if method != "POST" or not path.startswith(PREFIX):
+            return 404, {"error": "NotFound"}
+        fields = parse_qs(body.decode("utf-8"))
+        name = path[len(PREFIX):].rstrip("/")
+        if name == "games":
+            return self.new_game(fields)
+        if name.startswith("games/") and name[len("games/"):].isdigit():
+            return self.new_move(int(name[len("games/"):]), fields)
+        return 404, {"error": "NotFound"}
+
+    async def handle(self, reader, writer):
+        """
+            Serve the requests of a connection until the client closes it.
+        """
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly( \
+                    int(headers.get("content-length", 0)))
+
+                self.requests += 1
+                status, content = self.route(method, urlsplit(target).path, \
+                    body)
+                data = json.dumps(content).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(("HTTP/1.1 %d %s\r\n" \
+                    "Content-Type: application/json\r\n" \
+                    "Content-Length: %d\r\nConnection: %s\r\n\r\n" % \
+                    (status, "OK" if status == 200 else "Error", len(data), \
+                    "keep-alive" if keep_alive else "close")) \
+                    .encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, \
+                asyncio.CancelledError):
+            # Client gone or server shutting down
+            pass
+        finally:
+            writer.close()
+
+###############################################################################
+
+async def start(host="127.0.0.1", port=0, **kwargs):
+    """
+        Start a stub server.
+
+        Arguments:
+        - host:   the address to listen on
+        - port:   the port to listen on, 0 for any free port
+        - kwargs: arguments of StubServer
+
+        Return value:
+        - server: the asyncio server, see server.sockets for the port
+        - stub:   the StubServer with the games and counters
+    """
+    stub = StubServer(**kwargs)
+    server = await asyncio.start_server(stub.handle, host, port)
+    return server, stub
+
+class ServerThread(object):
+    """
+        Stub server running its own event loop in a thread, for callers which
+        are not coroutines themselves, such as test.py.
+
+        Arguments:
+        - host:   the address to listen on, on any free port
+        - kwargs: arguments of StubServer
+    """
+    def __init__(self, host="127.0.0.1", **kwargs):
+        self.host = host
+        self.kwargs = kwargs
+        self.loop = self.thread = None
+        self.server = self.stub = self.url = None
+
+    def _run(self, ready):
+        """
+            Serve until stop() is called, in the thread.
+        """
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server, self.stub = self.loop.run_until_complete( \
+            start(self.host, 0, **self.kwargs))
+        self.url = "http://%s:%d%s" % (self.host, \
+            self.server.sockets[0].getsockname()[1], PREFIX)
+        ready.set()
+        self.loop.run_forever()
+
+        # Drop the connections the clients left open
+        self.server.close()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, \
+            return_exceptions=True))
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def start(self):
+        """
+            Start serving, see self.url for the URL prefix of the server.
+
+            Return value:
+            - self
+        """
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(ready,))
+        self.thread.daemon = True
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """
+            Stop serving and wait for the thread to end.
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8080)
+    parser.add_argument("--opponent", choices=OPPONENTS, default="random")
+    parser.add_argument("--max-moves", type=int, default=selfplay.MAX_MOVES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async def serve():
+        server, _ = await start(args.host, args.port, \
+            opponent=args.opponent, max_moves=args.max_moves, seed=args.seed)
+        sys.stderr.write("Serving on http://%s:%d%s\n" % \
+            (args.host, args.port, PREFIX))
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
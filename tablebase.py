@@ -0,0 +1,163 @@
+import sys
+import time
+import argparse
+import itertools
+from array import array
+
+import ai
+
+###############################################################################
+#
+# Endgame table generator
+#
+# Retrograde analysis of every position with few discs: the positions where
+# the next player cannot move are lost, the parents of a lost position are
+# won, and a position is lost once all its children are won. Positions never
+# resolved are draws, both players being able to avoid a loss forever.
+#
+# Positions are processed in order of their distance to the end of the game
+# so that the winner takes the shortest way and the loser the longest one.
+#
+###############################################################################
+
+# Default maximum number of discs
+PIECES = 3
+
+###############################################################################
+
+def positions(pieces):
+    """
+        Enumerate the valid positions covered by a table.
+
+        Arguments:
+        - pieces: maximum number of discs
+
+        Return value:
+        - positions: iterator of (black, white, kings) masks, a man is never
+                     on its promotion row
+    """
+    layout, _ = ai._endgame_layout(pieces)
+    promo_row = ai._LAYOUT.promo_row
+    squares = {
+        "b": [b for b in ai._DARK_BITS if not promo_row["b"] >> b & 1],
+        "B": ai._DARK_BITS,
+        "w": [b for b in ai._DARK_BITS if not promo_row["w"] >> b & 1],
+        "W": ai._DARK_BITS,
+    }
+    for counts in sorted(layout):
+        groups = [itertools.combinations(squares[k], n) \
+            for k, n in zip("bBwW", counts)]
+        for bm, bk, wm, wk in itertools.product(*[list(g) for g in groups]):
+            bits = bm + bk + wm + wk
+            if len(set(bits)) != len(bits):
+                continue
+            black = sum(1 << b for b in bm + bk)
+            white = sum(1 << b for b in wm + wk)
+            kings = sum(1 << b for b in bk + wk)
+            yield black, white, kings
+
+###############################################################################
+
+def generate(pieces=PIECES, log=None):
+    """
+        Solve all the positions with up to the given number of discs.
+
+        Arguments:
+        - pieces: maximum number of discs, at most 4
+        - log:    function called with progress messages, if any
+
+        Return value:
+        - values: bytearray of the table slots, see ai.EndgameTable
+    """
+    layout, size = ai._endgame_layout(pieces)
+    index = ai.EndgameTable.index
+    values = bytearray(size)
+    remaining = array("H", [0]) * size
+    sources = array("I")
+    targets = array("I")
+    lost = []
+
+    # Forward pass: moves of every position
+    start = time.time()
+    for black, white, kings in positions(pieces):
+        pos = (black, white, kings)
+        for color in "bw":
+            i = index(layout, black, white, kings, color)
+            moves = ai._gen_moves(pos, color)
+            if moves == []:
+                values[i] = 2
+                lost.append(i)
+                continue
+            other = "w" if color == "b" else "b"
+            remaining[i] = len(moves)
+            for move in moves:
+                child = ai._apply_move(pos, color, move)
+                sources.append(i)
+                targets.append(index(layout, child[0], child[1], child[2], \
+                    other))
+    if log:
+        log("%d moves generated in %.1fs" % (len(sources), time.time() - start))
+
+    # Parents of each position, sorted by child
+    first = array("I", [0]) * (size + 1)
+    for t in targets:
+        first[t + 1] += 1
+    for i in range(0, size):
+        first[i + 1] += first[i]
+    parents = array("I", [0]) * len(sources)
+    fill = array("I", first)
+    for s, t in zip(sources, targets):
+        parents[fill[t]] = s
+        fill[t] += 1
+    del sources, targets, fill
+
+    # Backward pass in order of distance to the end of the game
+    queue = lost
+    for i in queue:
+        moves = values[i] - 2
+        if moves + 3 > 255:
+            raise ValueError("Game too long for the table format")
+        for j in parents[first[i]:first[i + 1]]:
+            if values[j]:
+                continue
+            if moves % 2 == 0:
+                values[j] = moves + 3
+                queue.append(j)
+            else:
+                remaining[j] -= 1
+                if remaining[j] == 0:
+                    values[j] = moves + 3
+                    queue.append(j)
+
+    for i in range(0, size):
+        if remaining[i] and not values[i]:
+            values[i] = 1
+    if log:
+        log("%d positions solved in %.1fs" % (len(queue), time.time() - start))
+
+    return values
+
+###############################################################################
+
+def write(path, pieces, values):
+    """
+        Write a table in the format read by ai.EndgameTable.
+    """
+    header = ai._ENDGAME_MAGIC + bytearray([pieces]) + \
+        bytearray(ai._ENDGAME_HEADER - len(ai._ENDGAME_MAGIC) - 1)
+    with open(path, "wb") as f:
+        f.write(bytes(header))
+        f.write(bytes(values))
+
+###############################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an endgame table.")
+    parser.add_argument("-n", "--pieces", type=int, default=PIECES,
+        choices=range(1, 5), help="maximum number of discs")
+    parser.add_argument("-o", "--output", default=ai.ENDGAME_PATH)
+    args = parser.parse_args()
+
+    log = lambda msg: sys.stderr.write(msg + "\n")
+    write(args.output, args.pieces, generate(args.pieces, log))
+    log("Table written to %s" % args.output)
@@ -1,5 +1,18 @@
-import main
+import os
+import sys
+import tempfile
+import subprocess
+import random
+import io
 import ai
+import selfplay
+import perft
+import tablebase
+import openingbook
+import gamerecord
+
+# Seconds allowed to a new process to import the engine and the local tools
+IMPORT_BUDGET = 0.1
 
 def convert_board(size, board):
     board = board.replace('\n', '')
@@ -25,6 +38,40 @@ def check_moves(moves, ground_truth):
         print("OK")
     return ok
 
+def check_value(value, ground_truth):
+    ok = value == ground_truth
+    if ok:
+        print("OK")
+    else:
+        print("FAILED: expected " + str(ground_truth) + ", got " + str(value))
+    return ok
+
+def minimax_best_move(board, our_color, depth):
+    their_color = 'b' if our_color == 'w' else 'w'
+    best_move, best_score = [], ai._eval_board(board, our_color)
+    for our_move in ai.allowed_moves(board, our_color):
+        board1 = ai._update_board_move(board, our_move)
+        their_score = ai._eval_board(board1, our_color)
+        for i, their_move in enumerate(ai.allowed_moves(board1, their_color)):
+            board2 = ai._update_board_move(board1, their_move)
+            if depth > 0:
+                _, score = minimax_best_move(board2, our_color, depth - 1)
+            else:
+                score = ai._last_eval_board(board2, our_color, our_color)
+            if i == 0 or score < their_score:
+                their_score = score
+        if best_move == [] or their_score > best_score:
+            best_move, best_score = our_move, their_score
+    return best_move, best_score
+
+def minimax_last_eval(board, our_color, player_color):
+    next_color = 'b' if player_color == 'w' else 'w'
+    scores = [minimax_last_eval(ai._update_board_move(board, move), our_color,
+        next_color) for move in ai.allowed_moves(board, player_color, False)]
+    if scores == []:
+        return ai._eval_board(board, our_color)
+    return max(scores) if player_color == our_color else min(scores)
+
 def test_01_move_black_disc():
     board = convert_board(8, """
 ________
@@ -236,12 +283,619 @@ ____B___
     moves = ai.allowed_moves(board, 'b')
     return board, ground_truth, check_moves(moves, ground_truth)
 
+def test_14_bitboard_update():
+    board = convert_board(8, """
+________
+b___b___
+_w_w_w__
+________
+_w_w_W__
+________
+_W_w____
+____B___
+""")
+    pos = ai._board_to_bits(board)
+    ground_truth = [ai._update_board_move(board, m) for m in ai.allowed_moves(board, 'b')]
+    boards = [ai._bits_to_board(ai._apply_move(pos, 'b', m)) for m in ai._gen_moves(pos, 'b')]
+    return board, ground_truth, check_value(boards, ground_truth)
+
+def test_15_alpha_beta_matches_minimax():
+    board = convert_board(8, """
+_b_b_b_b
+b_b___b_
+________
+__b_b_b_
+_____b__
+w_w___w_
+___w_w_w
+w_w_w_w_
+""")
+    ground_truth = minimax_best_move(board, 'w', 1)
+    results = [ai._find_best_move(board, 'w', 1, ordering) for ordering in \
+        [None, (), ('history', 'killers')]]
+    return board, ground_truth, check_value(results, [ground_truth] * 3)
+
+def test_16_iterative_deepening():
+    board = convert_board(8, """
+_b_b_b_b
+b_b___b_
+________
+__b_b_b_
+_____b__
+w_w___w_
+___w_w_w
+w_w_w_w_
+""")
+    ground_truth = [ai._find_best_move(board, 'w', 1), True, 6]
+    result = ai.search_move(board, 'w', max_depth=1)
+    timed = ai.search_move(board, 'w', time_limit=0.2)
+    legal = timed.move in ai.allowed_moves(board, 'w') and timed.time < 0.5
+    # Kings never run out of moves, only MAX_DEPTH ends a long search
+    kings = ["_B______"] + ["________"] * 6 + ["______W_"]
+    max_depth = ai.MAX_DEPTH
+    ai.MAX_DEPTH = 6
+    try:
+        capped = ai.search_move(kings, 'b', time_limit=10,
+            table=ai.TranspositionTable(1))
+    finally:
+        ai.MAX_DEPTH = max_depth
+    return board, ground_truth, check_value([(result.move, result.score),
+        legal, capped.depth], ground_truth)
+
+def test_17_transposition_table():
+    board = convert_board(8, """
+_b_b_b_b
+b_b___b_
+________
+__b_b_b_
+_____b__
+w_w___w_
+___w_w_w
+w_w_w_w_
+""")
+    ground_truth = [ai._find_best_move(board, 'w', 1)] * 2 + [True, 3]
+    table = ai.TranspositionTable(1)
+    first = ai.search_move(board, 'w', max_depth=1, table=table)
+    hits = table.hits
+    second = ai.search_move(board, 'w', max_depth=1, table=table)
+    # Cutoffs on the entries of a previous turn must not look like the end
+    # of the game tree to the iterative deepening
+    ai.search_move(board, 'w', max_depth=3, table=table)
+    third = ai.search_move(board, 'w', max_depth=3, table=table)
+    results = [(first.move, first.score), (second.move, second.score), \
+        table.hits > hits and second.nodes < first.nodes, third.depth]
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_18_capture_chains_order():
+    board = convert_board(8, """
+_____W__
+____b_b_
+________
+__B___w_
+________
+__b_____
+________
+________
+""")
+    ground_truth = [[(0, 5), (2, 7)], [(0, 5), (2, 3), (4, 1), (6, 3)]] * 2
+    ai.clear_caches()
+    moves = ai.allowed_moves(board, 'w') + ai.allowed_moves(board, 'w')
+    return board, ground_truth, check_value(moves, ground_truth)
+
+def test_19_make_unmake_move():
+    board = convert_board(8, """
+________
+b___b___
+_w_w_w__
+________
+_w_w_W__
+________
+_W_w____
+____B___
+""")
+    pos = ai.Position.from_board(board, 'b')
+    initial = (pos.bits(), pos.turn, pos.key)
+    ground_truth, results = [], []
+    for move in pos.moves():
+        new_pos = ai._apply_move(initial[0], 'b', move)
+        ground_truth.append((new_pos, ai._hash_bits(new_pos, 'w'), initial))
+        undo = pos.make_move(move)
+        made = (pos.bits(), pos.key)
+        pos.unmake_move(undo)
+        results.append(made + ((pos.bits(), pos.turn, pos.key),))
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_20_incremental_eval():
+    board = convert_board(8, """
+________
+b___b___
+_w_w_w__
+________
+_w_w_W__
+________
+_W_w____
+____B___
+""")
+    pos = ai.Position.from_board(board, 'b')
+    ground_truth, results = [], []
+    for move in pos.moves():
+        undo = pos.make_move(move)
+        new_board = ai._update_board_move(board, ai._move_path(move))
+        ground_truth.append([ai._eval_board(new_board, c) for c in 'bw'])
+        results.append([pos.evaluate(c) for c in 'bw'])
+        pos.unmake_move(undo)
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_21_parallel_search():
+    board = convert_board(8, """
+________
+b___b___
+_w_w_w__
+________
+_w_w_W__
+________
+_W_w____
+____B___
+""")
+    start = selfplay.initial_board(8)
+    serial = ai.search_move(start, 'b', max_depth=3,
+        table=ai.TranspositionTable(1))
+    ground_truth = [ai._find_best_move(board, c, 2) for c in 'bw'] + \
+        [(serial.move, serial.score)]
+    results = [ai.search_move(board, c, max_depth=2, workers=2) for c in 'bw']
+    results.append(ai.search_move(start, 'b', max_depth=3, workers=3))
+    ai.shutdown_workers()
+    return board, ground_truth, \
+        check_value([(r.move, r.score) for r in results], ground_truth)
+
+def test_22_selfplay_game():
+    board = convert_board(8, """
+________
+________
+________
+___w____
+____B___
+________
+________
+________
+""")
+    ground_truth = [test_06_move_black_initial()[0], ("b", 1), ("b", 1)]
+    results = [selfplay.initial_board(8)]
+    for players in ({"b": "ai", "w": "random"}, {"b": "random", "w": "ai"}):
+        record = selfplay.play_game(board, 'b', players, max_depth=1)
+        results.append((record["winner"], record["moves"]))
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_23_perft():
+    ground_truth, results = [], []
+    for name in sorted(perft.POSITIONS):
+        board, color, counts = perft.POSITIONS[name]
+        counts = counts[:4]
+        pos = ai._board_to_bits(board)
+        ground_truth.append((name, counts, counts))
+        results.append((name,
+            [perft.perft(board, color, d) for d in range(1, len(counts) + 1)],
+            [perft.perft_bits(pos, color, d) \
+                for d in range(1, len(counts) + 1)]))
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_24_search_stats():
+    board = convert_board(8, """
+________
+b___b___
+_w_w_w__
+________
+_w_w_W__
+________
+_W_w____
+____B___
+""")
+    table = ai.TranspositionTable(1)
+    result = ai.search_move(board, 'w', max_depth=2, table=table)
+    stats = ai.SearchStats()
+    table.clear()
+    stats_result = ai.search_move(board, 'w', max_depth=2, table=table, \
+        stats=stats)
+    ground_truth = [result.move, result.score, result.nodes, result.nodes,
+        [0, 1, 2]]
+    results = [stats_result.move, stats_result.score, stats_result.nodes,
+        sum(stats.nodes.values()) + stats.qnodes,
+        [i[0] for i in stats.iterations]]
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_25_quiescence():
+    board = convert_board(8, """
+________
+b___b___
+_w_w_w__
+________
+_w_w_W__
+________
+_W_w____
+____B___
+""")
+    pos = ai.Position.from_board(board, 'b')
+    ground_truth = [minimax_last_eval(board, c, p) for c in 'bw' for p in 'bw']
+    ground_truth.append(ai._eval_board(board, 'b'))
+    results = [ai._last_eval_board(board, c, p) for c in 'bw' for p in 'bw']
+    results.append(ai._last_eval_position(pos, 'b', depth=0))
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_26_endgame_table():
+    board = convert_board(8, """
+________
+________
+________
+____B___
+________
+________
+_w______
+________
+""")
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    tablebase.write(path, 2, tablebase.generate(2))
+    table = ai.EndgameTable(path)
+    ground_truth, results = [], []
+    for color in 'bw':
+        result = ai.search_move(board, color, max_depth=0, endgame=table)
+        child = ai._update_board_move(board, result.move)
+        pos = ai.Position.from_board(child, 'b' if color == 'w' else 'w')
+        ground_truth.append(table.score(pos, color))
+        results.append(result.score)
+    table.close()
+    os.remove(path)
+    ground_truth += [True, 0]
+    results += [results[0] > ai.ENDGAME_WIN - 10, results[1]]
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_27_opening_book():
+    games = openingbook.read_log("output_game.txt")
+    board = games[0][0]
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    openingbook.write(path, openingbook.build(games))
+    book = ai.OpeningBook(path)
+    # The server started the second game, whose board is printed after its
+    # move: we play first, with white
+    second = games[1]
+    ground_truth = [[('b', 63, 'b'), ('w', 91, 'w')], [(2, 1), (3, 0)], None,
+        second[2][0]]
+    results = [[(g[1], len(g[2]), g[3]) for g in games], ai.play(board, 'b',
+        book=book), book.move(ai._update_board_move(board, [(2, 1), (3, 2)]),
+        'w'), book.move(second[0], 'w')]
+    # The keys depend on the board size, the same masks on another board
+    # are another position
+    large = selfplay.initial_board(10)
+    move = ai.allowed_moves(large, 'b')[-1]
+    openingbook.write(path, openingbook.build([(large, 'b', [move], 'b')]))
+    pos = ai._board_to_bits(large)
+    ground_truth += [move, False]
+    results += [ai.OpeningBook(path).move(large, 'b'),
+        ai.OpeningBook.key(pos, 'b', ai._layout(10)) ==
+        ai.OpeningBook.key(pos, 'b', ai._layout(8))]
+    os.remove(path)
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_28_larger_boards():
+    board = convert_board(10, """
+_b_b_b_b_b
+b_b_b_b_b_
+_b_b_b_b_b
+b_b_b_b_b_
+__________
+__________
+_w_w_w_w_w
+w_w_w_w_w_
+_w_w_w_w_w
+w_w_w_w_w_
+""")
+    ground_truth = [[(3, 0), (4, 1)], [(3, 2), (4, 1)], [(3, 2), (4, 3)], [(3, 4), (4, 3)], [(3, 4), (4, 5)], [(3, 6), (4, 5)], [(3, 6), (4, 7)], [(3, 8), (4, 7)], [(3, 8), (4, 9)]]
+    moves = ai.allowed_moves(board, 'b')
+    if not check_moves(moves, ground_truth) or \
+            not check_moves([ai.play(board, 'b', None)], [moves[0]]):
+        return board, ground_truth, False
+
+    board = convert_board(12, """
+____________
+____________
+____________
+____________
+____________
+____________
+________b___
+_______w_w__
+____________
+_____w___w__
+____________
+___w________
+""")
+    ground_truth = [[(6, 8), (8, 6), (10, 4)], [(6, 8), (8, 10), (10, 8)]]
+    moves = ai.allowed_moves(board, 'b')
+    return board, ground_truth, check_moves(moves, ground_truth)
+
+def test_29_async_client():
+    board = selfplay.initial_board(6)
+    if sys.version_info < (3, 7):
+        # The asynchronous client and the stub server need Python 3.7
+        return board, None, True
+    import json
+    import socket
+    import asyncio
+    import main
+    import asyncclient
+    import stubserver
+    from concurrent.futures import ProcessPoolExecutor
+
+    server = stubserver.ServerThread(max_moves=60).start()
+    try:
+        with ProcessPoolExecutor(2) as executor:
+            results, pool = asyncio.run(asyncclient.play_games(4,
+                {"name": "test"}, executor, 6, server.url, None, pool_size=2))
+            failed = asyncio.run(asyncclient.play_games(2, {"name": "test"},
+                executor, 6, server.url + "missing/", None))[0]
+        game = server.stub.new_game({"size": ["6"], "color": ["b"]})[1]
+        status, content = server.stub.route("POST", stubserver.PREFIX +
+            "games/%d" % game["id"], b"move=0&move=1&move=1&move=0")
+
+        # A pooled connection closed by the server is replaced once
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        loop = asyncio.new_event_loop()
+        stale = loop.run_until_complete(asyncio.open_connection(
+            "127.0.0.1", listener.getsockname()[1]))
+        listener.accept()[0].close()
+        listener.close()
+        retry = asyncclient.HTTPPool()
+        port = int(server.url.split(":")[2].split("/")[0])
+        retry.idle[("http", "127.0.0.1", port)] = [stale]
+        retried = loop.run_until_complete(retry.request("post",
+            server.url + "games", {"size": 6, "color": "b"}))[0]
+        retry.close()
+        loop.close()
+    finally:
+        server.stop()
+    try:
+        asyncclient._content(status, json.dumps(content).encode("utf-8"))
+        invalid = False
+    except main.InvalidMoveException:
+        invalid = True
+
+    ground_truth = [["b", "w", "b", "w"], True, 2, pool.requests + 3, True,
+        [{"color": "b", "error": "Exception: NotFound"},
+        {"color": "w", "error": "Exception: NotFound"}], (200, 1, 1)]
+    results = [[r["color"] for r in results],
+        all(r["winner"] in ("b", "w", " ") and r["moves"] > 0 for r in results),
+        pool.opened, server.stub.requests, invalid, failed,
+        (retried, retry.opened, retry.requests)]
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_30_pondering():
+    board = selfplay.initial_board(8)
+    table = ai.TranspositionTable(1)
+    ponderer = ai.Ponderer(table)
+    move = ai.search_move(board, 'b', table=table).move
+    board = ai._update_board_move(board, move)
+    ponderer.start(board, 'b', None)
+    ponderer.thread.join()
+    predicted = ponderer.board
+    reply = ai.search_move(board, 'w', table=ai.TranspositionTable(1)).move
+    ground_truth = [ai._update_board_move(board, reply),
+        ai.search_move(predicted, 'b', table=ai.TranspositionTable(1)).move,
+        None, (1, 1)]
+    results = [predicted, ponderer.take(predicted, 'b', None).move]
+    ponderer.start(board, 'b', None)
+    results.append(ponderer.take(ai._update_board_move(board, [(5, 0),
+        (4, 1)]), 'b', None))
+    results.append((ponderer.hits, ponderer.misses))
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_31_batch_eval():
+    board = convert_board(8, """
+________
+__b_____
+_B_b____
+____w___
+___W____
+______w_
+_____w__
+________
+""")
+    try:
+        import numpy
+    except ImportError:
+        # NumPy is only needed by the batch evaluation
+        return board, None, True
+    boards = [board, selfplay.initial_board(8),
+        ai._update_board_move(board, [(2, 3), (4, 5), (6, 7)])]
+    ground_truth = [[ai._eval_board(b, c) for b in boards] for c in "bw"]
+    results = [list(ai.eval_boards(boards, c)) for c in "bw"]
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_32_game_records():
+    games = openingbook.read_log("output_game.txt")
+    record = selfplay.play_game(selfplay.random_opening(random.Random(0), 2,
+        6)[0], 'b', {"b": "random", "w": "random"}, seed=1)
+    games.append((record["opening"], record["first"], record["history"],
+        record["winner"]))
+    board = selfplay.initial_board(8)
+    games.append((board, 'w', [[(5, 0), (3, 2)], [(2, 1), (3, 0)]], None))
+    f = io.BytesIO()
+    writer = gamerecord.GameWriter(f)
+    for game in games:
+        writer.write(*game)
+    f.seek(0)
+    replayed = list(gamerecord.read(f))
+    ground_truth = [games, ai._update_board_move(ai._update_board_move(board,
+        [(5, 0), (3, 2)]), [(2, 1), (3, 0)]), True]
+    results = [[tuple(g) for g in replayed],
+        list(gamerecord.boards(replayed[-1]))[-1][0],
+        len(f.getvalue()) < len(open("output_game.txt").read()) // 50]
+    # A disc on a light square cannot be recorded
+    light = ["b" + row[1:] if r == 0 else row for r, row in enumerate(board)]
+    try:
+        writer.write(light, 'b', [], None)
+        results.append(False)
+    except ValueError:
+        results.append(True)
+    ground_truth.append(True)
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_33_board():
+    rows = convert_board(8, """
+________
+__b_____
+_B_b____
+____w___
+___W____
+______w_
+_____w__
+________
+""")
+    board = ai.Board(rows)
+    ground_truth = [True, ai.allowed_moves(rows, 'b'), ai.play(rows, 'b', None),
+        (1, 3, 4, 1), ai._update_board_move(rows, [(2, 3), (4, 5), (6, 7)]),
+        True]
+    results = [board is ai.Board(list(rows)) and board == rows and
+        hash(board) == hash(ai.Board(rows)), ai.allowed_moves(board, 'b'),
+        ai.play(board, 'b', None), (board.count('b', True),
+        board.count('b'), board.count('w'), board.count('w', True)),
+        board.after([(2, 3), (4, 5), (6, 7)]),
+        board.moves('b') is board.moves('b')]
+    return rows, ground_truth, check_value(results, ground_truth)
+
+def test_34_analysis_cache():
+    board = selfplay.initial_board(8)
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    cache = ai.AnalysisCache(path, max_entries=2)
+    key = ai.AnalysisCache.key(ai._board_to_bits(board), 'b')
+    result = ai.search_move(board, 'b', max_depth=2, cache=cache)
+    ground_truth = [result.move, (result.move, 0), (2, 0, result.score),
+        None, 2]
+    cached = ai.search_move(board, 'b', max_depth=1, cache=cache)
+    results = [ai.search_move(board, 'b', max_depth=2,
+        table=ai.TranspositionTable(1)).move,
+        (cached.move, cached.nodes), ai.AnalysisCache(path).get(key)]
+    ai.KING_VAL += 1
+    results.append(ai.AnalysisCache(path).get(key))
+    ai.KING_VAL -= 1
+    for i in range(0, 3):
+        cache.put(i, 1, 0, 0.0)
+    cache.evict()
+    results.append(cache.stats()["entries"])
+    cache.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_35_import_time():
+    modules = "ai, selfplay, perft, tablebase, openingbook, gamerecord"
+    output = subprocess.check_output([sys.executable, "-c", "import sys, time; "
+        "start = time.time(); import %s; print(time.time() - start); "
+        "print('requests' in sys.modules)" % modules],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed, network = output.decode("ascii").split()
+    ground_truth = [True, "False"]
+    results = [float(elapsed) < IMPORT_BUDGET, network]
+    return selfplay.initial_board(8), ground_truth, check_value(results,
+        ground_truth)
+
+def test_36_move_cache():
+    board = selfplay.initial_board(8)
+    pos = ai._board_to_bits(board)
+    other = ai._board_to_bits(ai._update_board_move(board, [(2, 1), (3, 0)]))
+    cache = ai.MoveCache(2.0 * ai.MoveCache.ENTRY_SIZE / 2 ** 20)
+    moves = cache.moves(pos, 'b')
+    ground_truth = [tuple(ai._gen_moves(pos, 'b')), True,
+        [(True, 'b'), (True, 'w')],
+        {"size": 2, "used": 2, "hits": 2, "misses": 3, "evictions": 1},
+        {"size": 2, "used": 0, "hits": 0, "misses": 0, "evictions": 0},
+        ai.allowed_moves(board, 'b')]
+    results = [moves, cache.moves(pos, 'b') is moves]
+    cache.moves(other, 'w')
+    cache.moves(pos, 'b')
+    cache.moves(pos, 'w')
+    results.append(sorted((k[:3] == pos, k[3]) for k in cache.entries))
+    results.append(cache.stats())
+    cache.clear()
+    results.append(cache.stats())
+    results.append(ai.allowed_moves(board, 'b'))
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_37_analysis_service():
+    import json
+    import analyze
+    board = selfplay.initial_board(8)
+    expected = ai.search_move(board, 'b', None, 2)
+    lines = [json.dumps({"id": "a", "board": board, "color": 'b',
+            "max_depth": 2, "stats": True}),
+        "",
+        "[1, 2]",
+        json.dumps({"board": board, "color": 'x', "max_depth": 2}),
+        json.dumps({"board": board, "color": 'w', "time_limit": None})]
+    out = io.StringIO()
+    count = analyze.serve(lines, out)
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    first = responses[0]
+
+    # An unexpected error of the engine must not stop the service
+    def failing(*args, **kwargs):
+        raise OverflowError("search failed")
+    search_move = ai.search_move
+    ai.search_move = failing
+    try:
+        failed = io.StringIO()
+        failed_count = analyze.serve(lines[:1] * 2, failed)
+    finally:
+        ai.search_move = search_move
+
+    ground_truth = [4, ["a", 3, 4, 5],
+        [[list(s) for s in expected.move], expected.score, expected.depth],
+        True, True, [False, True, True, True],
+        [2, ['{"error": "OverflowError: search failed", "id": "a"}'] * 2]]
+    results = [count, [r["id"] for r in responses],
+        [first["move"], first["score"], first["depth"]],
+        first["pv"][0] == first["move"] and
+            len(first["pv"]) <= 2 * (first["depth"] + 1),
+        first["stats"]["nodes"] != [],
+        ["error" in r for r in responses],
+        [failed_count, failed.getvalue().splitlines()]]
+    return board, ground_truth, check_value(results, ground_truth)
+
+def test_38_benchmarks():
+    import bench
+    board = bench.CORPUS["capture_combo"][1]
+    report = bench.run(["start", "capture_combo"], repeat=1, number=1)
+    slower = dict(report["benchmarks"]["play"])
+    slower["p50"] *= 2
+    slower["nodes_per_second"] *= 1.1
+    changes = bench.compare({"benchmarks": {"play": slower}}, report)
+    ground_truth = [2.5, 1.0, 4.0,
+        {"opening", "middlegame", "tactical", "endgame"}, True,
+        sorted(["play", "allowed_moves", "_eval_board", "_last_eval_board"]),
+        [2, 2, 2, 2],
+        [("nodes_per_second", False), ("p50", True), ("p95", False),
+            ("p99", False), ("peak_memory", False)]]
+    results = [bench.percentile([4, 1, 3, 2], 50),
+        bench.percentile([4, 1, 3, 2], 0), bench.percentile([4, 1, 3, 2], 100),
+        set(c[0] for c in bench.CORPUS.values()),
+        all(ai.allowed_moves(b, c) for _, b, c in bench.CORPUS.values()),
+        sorted(report["benchmarks"]),
+        [report["benchmarks"][name]["calls"] for name in
+            sorted(report["benchmarks"])],
+        [(c[1], c[5]) for c in changes]]
+    return board, ground_truth, check_value(results, ground_truth)
+
 if __name__ == "__main__":
     for f in dir():
         if f.startswith("test_"):
             print("Running '%s':" % f)
             (board, ground_truth, ok) = eval("%s()" % f)
             if not ok:
+                import main
                 main.print_board(board)
                 break
     if ok: